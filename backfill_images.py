@@ -0,0 +1,28 @@
+from shared.db import Session, Menu
+from shared.images import MENU_IMAGES_DIR, ingest_image, default_file, InvalidImage
+import os
+
+# Одноразово ріжемо WebP/JPEG-варіанти для страв, доданих до конвеєра shared/images.py.
+# Старий файл у static/menu не чіпаємо - на нього можуть вести збережені посилання.
+# Повторний запуск безпечний: страви з маніфестом пропускаються.
+with Session() as cursor:
+    positions = cursor.query(Menu).filter(Menu.images.is_(None), Menu.file_name.isnot(None)).all()
+
+    done = 0
+    for position in positions:
+        path = os.path.join(MENU_IMAGES_DIR, position.file_name)
+        if not os.path.exists(path):
+            print(f"⚠ #{position.id} {position.name}: немає файлу {position.file_name}")
+            continue
+        try:
+            images = ingest_image(path)
+        except InvalidImage as e:
+            print(f"⚠ #{position.id} {position.name}: {e}")
+            continue
+
+        position.images    = images
+        position.file_name = default_file(images)
+        done += 1
+
+    cursor.commit()
+    print(f"✅ Нарізано фото для {done} страв!")
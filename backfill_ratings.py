@@ -0,0 +1,21 @@
+from shared.db import Session
+from sqlalchemy import text
+
+# Одноразово переносимо рейтинги з reviews в агрегати menu.rating_count / menu.rating_sum.
+# Далі їх підтримують add_review / delete_review, тож запускати повторно не потрібно
+# (але й не шкідливо - результат той самий).
+with Session() as cursor:
+    updated = cursor.execute(text("""
+        UPDATE menu m
+        SET rating_count = coalesce(r.cnt, 0),
+            rating_sum   = coalesce(r.total, 0)
+        FROM menu m2
+        LEFT JOIN (
+            SELECT menu_id, count(*) AS cnt, sum(rating) AS total
+            FROM reviews
+            GROUP BY menu_id
+        ) r ON r.menu_id = m2.id
+        WHERE m.id = m2.id
+    """)).rowcount
+    cursor.commit()
+    print(f"✅ Оновлено рейтинги для {updated} страв!")
@@ -0,0 +1,82 @@
+"""
+Бенчмарк: чи блокують запити до БД event loop бота.
+
+N апдейтів подаються в Dispatcher одночасно (dp.feed_update), кожен хендлер робить
+повільний запит SELECT pg_sleep(delay). Синхронний Session тримає весь event loop
+на час запиту - апдейти йдуть по черзі, разом ~N × delay. AsyncSession віддає loop
+під час очікування - разом ~delay, поки вистачає з'єднань у пулі (pool_size + max_overflow).
+
+    python bench_bot_db.py --updates 20 --delay 0.2
+
+Telegram не потрібен: хендлери нічого не надсилають, токен бота фіктивний.
+"""
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.types import Update, Message, Chat, User
+from sqlalchemy import text
+from datetime import datetime
+from time import perf_counter
+import argparse
+import asyncio
+
+from shared.db import Session, AsyncSession, engine
+
+
+SLOW_QUERY = text("SELECT pg_sleep(:delay)")
+
+router = Router()
+
+
+@router.message(F.text.startswith('sync:'))
+async def slow_sync(message: Message):
+    # Так бот ходив у БД до AsyncSession
+    with Session() as cursor:
+        cursor.execute(SLOW_QUERY, {"delay": float(message.text.split(':')[1])})
+
+
+@router.message(F.text.startswith('async:'))
+async def slow_async(message: Message):
+    async with AsyncSession() as cursor:
+        await cursor.execute(SLOW_QUERY, {"delay": float(message.text.split(':')[1])})
+
+
+def make_update(update_id, body):
+    user = User(id=update_id, is_bot=False, first_name='bench')
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id, date=datetime.now(), text=body,
+        chat=Chat(id=update_id, type='private'), from_user=user,
+    ))
+
+
+async def run(dp, bot, mode, updates, delay):
+    batch = [make_update(i, f"{mode}:{delay}") for i in range(updates)]
+    started = perf_counter()
+    await asyncio.gather(*(dp.feed_update(bot, update) for update in batch))
+    return perf_counter() - started
+
+
+async def main(updates, delay):
+    engine.echo = False          # shared.db логує кожен запит - тут це тільки шум
+    bot = Bot(token='42:bench')
+    dp  = Dispatcher()
+    dp.include_router(router)
+
+    # Прогрів: з'єднання пулів відкриваються не в заміряному запуску
+    await run(dp, bot, 'sync', 1, 0)
+    await run(dp, bot, 'async', min(updates, 20), 0)
+
+    sync_time  = await run(dp, bot, 'sync', updates, delay)
+    async_time = await run(dp, bot, 'async', updates, delay)
+    await bot.session.close()
+
+    print(f"{updates} апдейтів, запит {delay} с кожен")
+    print(f"  Session (sync):  {sync_time:6.2f} с  (послідовно було б {updates * delay:.2f} с)")
+    print(f"  AsyncSession:    {async_time:6.2f} с")
+    print(f"  виграш: ×{sync_time / async_time:.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--updates', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(main(args.updates, args.delay))
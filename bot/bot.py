@@ -1,28 +1,58 @@
 import asyncio
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from bot.handlers.common import router as common_router
 from bot.handlers.user import router as user_router
 from bot.handlers.admin import router as admin_router
+from bot.identity import IdentityMiddleware, listen_identity_changes
+from bot.send_queue import send_queue
+from bot.storage import PostgresStorage
 from dotenv import load_dotenv
 import os
 
 
 load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+MAX_CONCURRENT_UPDATES = int(os.getenv('BOT_MAX_CONCURRENT_UPDATES', 32))   # апдейтів одночасно в одному процесі
 
 
 bot = Bot(token=BOT_TOKEN)
-dp  = Dispatcher(storage=MemoryStorage())
+# FSM у Postgres, а не в пам'яті: діалог переживає рестарт і доступний будь-якому воркеру
+storage = PostgresStorage()
+dp      = Dispatcher(storage=storage)
 
 # Підключаємо роутери
 dp.include_router(admin_router)
 dp.include_router(common_router)
 dp.include_router(user_router)
 
+# Прив'язаний юзер приходить у хендлери аргументом user - з кешу, а не запитом
+identity = IdentityMiddleware()
+for router in (admin_router, common_router, user_router):
+    router.message.middleware(identity)
+    router.callback_query.middleware(identity)
+
+async def start_services():
+    """Фонові частини бота, спільні для polling і webhook. Повертає задачу LISTEN."""
+    listener = asyncio.create_task(listen_identity_changes())
+    send_queue.start(bot)
+    storage.start_cleanup()
+    return listener
+
+
+async def stop_services(listener):
+    await storage.close()
+    await send_queue.stop()
+    listener.cancel()
+    await asyncio.gather(listener, return_exceptions=True)
+
+
 async def main():
-    print("☢ Бот запущено...")
-    await dp.start_polling(bot)
+    print("☢ Бот запущено (polling)...")
+    listener = await start_services()
+    try:
+        await dp.start_polling(bot, tasks_concurrency_limit=MAX_CONCURRENT_UPDATES)
+    finally:
+        await stop_services(listener)
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
@@ -1,13 +1,21 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from shared.db import Session, Users, Orders, Reservation, Menu
-from sqlalchemy.orm import joinedload
-from bot.keyboards import ADMIN_CHAT_ID, order_status_keyboard
+from shared.db import AsyncSession, Orders, OrderItem, Reservation, Menu, notify_menu_changed
+from sqlalchemy import select, literal
+from sqlalchemy.orm import joinedload, selectinload
+from bot.keyboards import ADMIN_CHAT_ID, order_status_button
+from bot.paginator import Paginator
+from bot.send_queue import send_queue
+from shared.images import MENU_IMAGES_DIR, ingest_image, default_file, smallest_file, InvalidImage
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import tempfile
+import asyncio
 from datetime import datetime, date
-import os, uuid
+import os
 
 router = Router()
 
@@ -19,6 +27,14 @@ STATUS_LABELS = {
 }
 STATUS_ORDER = ['new', 'preparing', 'ready', 'delivered']
 
+ORDERS_PAGE_SIZE       = 8
+RESERVATIONS_PAGE_SIZE = 15
+ORDER_ITEMS_PREVIEW    = 300    # довгий кошик обрізаємо, щоб сторінка влізла в 4096 символів
+
+# Ресайз фото - CPU-робота, event loop бота її не виконує. spawn, бо fork процесу
+# з запущеним event loop і відкритими з'єднаннями ненадійний.
+image_pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+
 
 # FSM для додавання страви
 class AddDish(StatesGroup):
@@ -34,132 +50,173 @@ class AddDish(StatesGroup):
 def admin_only(message: Message) -> bool:
     return message.chat.id == ADMIN_CHAT_ID
 
+# Те саме для кнопок: callback_data легко підробити в будь-якому чаті з ботом
+admin_callback = F.message.chat.id == ADMIN_CHAT_ID
+
+
+
+def next_status_of(status):
+    """Наступний статус замовлення або None, якщо вже доставлено."""
+    current_idx = STATUS_ORDER.index(status) if status in STATUS_ORDER else 0
+    if current_idx < len(STATUS_ORDER) - 1:
+        return STATUS_ORDER[current_idx + 1]
+    return None
+
+
+def render_orders(orders):
+    text, buttons = '', []
+    for order in orders:
+        items  = ', '.join(f"{item.name} ×{item.qty}" for item in order.items)
+        status = STATUS_LABELS.get(order.status, order.status)
+        if len(items) > ORDER_ITEMS_PREVIEW:
+            items = items[:ORDER_ITEMS_PREVIEW] + '…'
+
+        text += (
+            f"📦 *#{order.id}* — {order.user.nickname if order.user else '?'}\n"
+            f"📝 {items}\n"
+            f"⏰ {order.order_time.strftime('%d.%m %H:%M')} · {status}\n\n"
+        )
+
+        # Кнопка на наступний статус; для доставлених кнопки немає
+        next_status = next_status_of(order.status)
+        if next_status:
+            buttons.append([order_status_button(order.id, next_status, STATUS_LABELS[next_status])])
+    return text, buttons
+
+
+def render_today(reservations):
+    text = ''
+    for r in reservations:
+        text += (
+            f"🪑 Столик №{r.table.number} — {r.table.label}\n"
+            f"👤 {r.user.nickname if r.user else '?'}\n"
+            f"⏰ {r.time_start.strftime('%H:%M')}\n\n"
+        )
+    return text, []
+
+
+def render_reservations(reservations):
+    text = ''
+    for r in reservations:
+        text += (
+            f"🪑 №{r.table.number} | "
+            f"{r.user.nickname if r.user else '?'} | "
+            f"{r.time_start.strftime('%d.%m %H:%M')}\n"
+        )
+    return text, []
+
+
+def today_reservations():
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    today_end   = datetime.combine(date.today(), datetime.max.time())
+    return select(Reservation)\
+        .options(joinedload(Reservation.user), joinedload(Reservation.table))\
+        .filter(Reservation.time_start.between(today_start, today_end))
+
+
+# Списки для адміна - сторінками в одному повідомленні замість потоку повідомлень
+orders_pager = Paginator(
+    'orders',
+    query=lambda: select(Orders)
+        .options(joinedload(Orders.user), selectinload(Orders.items).joinedload(OrderItem.menu))
+        # Літерал, а не параметр $1: інакше узагальнений план підготовленого запиту asyncpg
+        # не може довести умову часткового індексу ix_orders_active_time (status <> 'delivered')
+        .filter(Orders.status != literal('delivered', literal_execute=True)),
+    time_column=Orders.order_time, id_column=Orders.id,
+    render=render_orders,
+    title="📋 *Активні замовлення ({total}):*",
+    empty_text="Активних замовлень немає.",
+    page_size=ORDERS_PAGE_SIZE, descending=True,
+)
+
+today_pager = Paginator(
+    'today',
+    query=today_reservations,
+    time_column=Reservation.time_start, id_column=Reservation.id,
+    render=render_today,
+    title="📅 *Бронювання на сьогодні ({total}):*",
+    empty_text="Сьогодні бронювань немає.",
+    page_size=RESERVATIONS_PAGE_SIZE,
+)
+
+reservations_pager = Paginator(
+    'res',
+    query=lambda: select(Reservation)
+        .options(joinedload(Reservation.user), joinedload(Reservation.table))
+        .filter(Reservation.time_end > datetime.now()),
+    time_column=Reservation.time_start, id_column=Reservation.id,
+    render=render_reservations,
+    title="👥 *Всі активні бронювання ({total}):*",
+    empty_text="Активних бронювань немає.",
+    page_size=RESERVATIONS_PAGE_SIZE,
+)
+
+PAGERS = {pager.name: pager for pager in (orders_pager, today_pager, reservations_pager)}
+
 
 
 @router.message(F.text == '📋 Замовлення', admin_only)
 async def admin_orders(message: Message):
-    with Session() as cursor:
-        orders = cursor.query(Orders)\
-            .options(joinedload(Orders.user))\
-            .filter(Orders.status != 'delivered')\
-            .order_by(Orders.order_time.desc())\
-            .all()
-
-        if not orders:
-            await message.answer("Активних замовлень немає.")
-            return
+    await orders_pager.send(message)
 
-        for order in orders:
-            items  = ', '.join(f"{n} ×{q}" for n, q in order.order_list.items())
-            status = STATUS_LABELS.get(order.status, order.status)
-
-            # Визначаємо наступний статус для кнопки
-            current_idx = STATUS_ORDER.index(order.status) if order.status in STATUS_ORDER else 0
-            kb = None
-            if current_idx < len(STATUS_ORDER) - 1:
-                next_status = STATUS_ORDER[current_idx + 1]
-                next_label  = STATUS_LABELS[next_status]
-                kb = order_status_keyboard(order.id, next_status, next_label)
-            # kb = None якщо статус 'delivered' - кнопки не буде
-
-            await message.answer(
-                f"📦 *Замовлення #{order.id}*\n"
-                f"👤 {order.user.nickname if order.user else '?'}\n"
-                f"📝 {items}\n"
-                f"⏰ {order.order_time.strftime('%d.%m %H:%M')}\n"
-                f"Статус: *{status}*",
-                parse_mode='Markdown',
-                reply_markup=kb
-            )
-
-
-@router.callback_query(F.data.startswith('status:'))
+
+@router.callback_query(F.data.startswith('page:'), admin_callback)
+async def turn_page(call: CallbackQuery):
+    _, name, direction, key = call.data.split(':', 3)
+    pager = PAGERS.get(name)
+    if not pager:
+        await call.answer()
+        return
+    await pager.turn(call, direction, key)
+
+
+@router.callback_query(F.data.startswith('status:'), admin_callback)
 async def change_order_status(call: CallbackQuery):
     _, order_id, new_status = call.data.split(':')
 
-    with Session() as cursor:
-        order = cursor.query(Orders)\
-            .options(joinedload(Orders.user))\
-            .filter_by(id=int(order_id)).first()
+    async with AsyncSession() as cursor:
+        order = await cursor.scalar(
+            select(Orders)
+            .options(joinedload(Orders.user), selectinload(Orders.items).joinedload(OrderItem.menu))
+            .filter_by(id=int(order_id))
+        )
 
         if not order:
             await call.answer("Замовлення не знайдено.")
             return
 
         order.status = new_status
-        cursor.commit()
+        await cursor.commit()
 
         status_label  = STATUS_LABELS.get(new_status, new_status)
         user_chat_id  = order.user.telegram_chat_id if order.user else None
-        order_items   = '\n'.join(f"  • {n} × {q}" for n, q in order.order_list.items())
+        order_items   = '\n'.join(f"  • {item.name} × {item.qty}" for item in order.items)
         order_id_val  = order.id
 
-    # Повідомити юзера якщо є chat_id
+    # Повідомити юзера якщо є chat_id - через чергу, з урахуванням лімітів Telegram
     if user_chat_id:
-        await call.bot.send_message(user_chat_id,
+        send_queue.notify(user_chat_id,
             f"🔔 *Статус замовлення #{order_id_val} змінено*\n\n"
             f"{order_items}\n\n"
             f"Новий статус: *{status_label}*",
             parse_mode='Markdown')
 
-    await call.message.edit_text(
-        f"✅ Замовлення #{order_id} → *{status_label}*",
-        parse_mode='Markdown'
-    )
+    # Сторінка зі списком оновлюється на місці - нове повідомлення не надсилаємо
+    await orders_pager.refresh(call, notice=f"✅ #{order_id} → {status_label}")
 
 
 
 
 @router.message(F.text == '📅 Бронювання сьогодні', admin_only)
 async def admin_today(message: Message):
-    today_start = datetime.combine(date.today(), datetime.min.time())
-    today_end   = datetime.combine(date.today(), datetime.max.time())
-
-    with Session() as cursor:
-        reservations = cursor.query(Reservation)\
-            .options(joinedload(Reservation.user), joinedload(Reservation.table))\
-            .filter(Reservation.time_start.between(today_start, today_end))\
-            .order_by(Reservation.time_start)\
-            .all()
-
-        if not reservations:
-            await message.answer("Сьогодні бронювань немає.")
-            return
-
-        text = f"📅 *Бронювання на сьогодні ({len(reservations)}):*\n\n"
-        for r in reservations:
-            text += (
-                f"🪑 Столик №{r.table.number} — {r.table.label}\n"
-                f"👤 {r.user.nickname if r.user else '?'}\n"
-                f"⏰ {r.time_start.strftime('%H:%M')}\n\n"
-            )
-
-    await message.answer(text, parse_mode='Markdown')
+    await today_pager.send(message)
 
 
 
 
 @router.message(F.text == '👥 Активні броні', admin_only)
 async def admin_all_reservations(message: Message):
-    with Session() as cursor:
-        reservations = cursor.query(Reservation)\
-            .options(joinedload(Reservation.user), joinedload(Reservation.table))\
-            .order_by(Reservation.time_start)\
-            .all()
-
-        if not reservations:
-            await message.answer("Активних бронювань немає.")
-            return
-
-        text = f"👥 *Всі активні бронювання ({len(reservations)}):*\n\n"
-        for r in reservations:
-            text += (
-                f"🪑 №{r.table.number} | "
-                f"{r.user.nickname if r.user else '?'} | "
-                f"{r.time_start.strftime('%d.%m %H:%M')}\n"
-            )
-
-    await message.answer(text, parse_mode='Markdown')
+    await reservations_pager.send(message)
 
 
 
@@ -215,36 +272,47 @@ async def add_dish_description(message: Message, state: FSMContext):
 async def add_dish_photo(message: Message, state: FSMContext):
     data = await state.get_data()
 
-    file_info = await message.bot.get_file(message.photo[-1].file_id)
-    downloaded = await message.bot.download_file(file_info.file_path)
-
-    filename = f"{uuid.uuid4()}.jpg"
-    filepath = os.path.join('web', 'static', 'menu', filename)
-
-    with open(filepath, 'wb') as f:
-        f.write(downloaded.read())
+    fd, upload_path = tempfile.mkstemp(suffix='.upload')
+    os.close(fd)
+    try:
+        # Файл пишеться на диск шматками по мірі завантаження, без читання в пам'ять цілком
+        file_info = await message.bot.get_file(message.photo[-1].file_id)
+        await message.bot.download_file(file_info.file_path, destination=upload_path)
+
+        # Нарізка WebP/JPEG - в окремому процесі, той самий конвеєр що й на сайті
+        images = await asyncio.get_running_loop().run_in_executor(image_pool, ingest_image, upload_path)
+    except InvalidImage as e:
+        await message.answer(f"❌ {e} Надішліть інше фото:")
+        return
+    finally:
+        os.remove(upload_path)
 
-    with Session() as cursor:
+    async with AsyncSession() as cursor:
         new_dish = Menu(
             name=data['name'],
             price=data['price'],
             weight=data['weight'],
             ingredients=data['ingredients'],
             description=data['description'],
-            file_name=filename,
+            file_name=default_file(images),
+            images=images,
             active=True
         )
         cursor.add(new_dish)
-        cursor.commit()
 
-        # Email всім юзерам
-        from web.app import email_new_menu_items, app
-        all_emails = [u.email for u in cursor.query(Users).with_entities(Users.email).all()]
-        with app.app_context():
-            email_new_menu_items(all_emails, [new_dish])
+        # Email всім юзерам - кампанія розсилки в тій самій транзакції, що й страва
+        from web.app import email_new_menu_items
+        email_new_menu_items([new_dish], cursor=cursor)
+        # Кеш меню живе в процесах сайту - скидаємо його там через NOTIFY
+        await notify_menu_changed(cursor)
+        await cursor.commit()
 
     await state.clear()
-    await message.answer(f"✅ Страву *{data['name']}* додано до меню!", parse_mode='Markdown')
+    await message.answer_photo(
+        FSInputFile(os.path.join(MENU_IMAGES_DIR, smallest_file(images))),
+        caption=f"✅ Страву *{data['name']}* додано до меню!",
+        parse_mode='Markdown'
+    )
 
 
 @router.message(AddDish.photo)
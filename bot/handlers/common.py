@@ -2,22 +2,17 @@ from aiogram import Router, F
 from aiogram.filters import CommandStart
 from aiogram.types import Message
 
-from shared.db import Session, Users, TelegramCode
+from shared.db import AsyncSession, Users, TelegramCode, notify_bot_identity
+from sqlalchemy import select
 from bot.keyboards import main_keyboard, ADMIN_CHAT_ID
+from bot.identity import identity_cache
 from datetime import datetime
 
 router = Router()
 
 
-def get_user_by_chat_id(chat_id: int):
-    """Шукає юзера в БД по його chat_id"""
-    with Session() as cursor:
-        return cursor.query(Users).filter_by(telegram_chat_id=chat_id).first()
-
-
-
 @router.message(CommandStart())
-async def start(message: Message):
+async def start(message: Message, user):
     chat_id = message.chat.id
 
     if chat_id == ADMIN_CHAT_ID:
@@ -28,7 +23,6 @@ async def start(message: Message):
         )
         return
 
-    user = get_user_by_chat_id(chat_id)
     if user:
         await message.answer(
             f"☢ З поверненням, *{user.nickname}*!",
@@ -54,17 +48,17 @@ async def link_account(message: Message):
 
 
 @router.message(F.text.len() == 8)
-async def process_link_code(message: Message):
+async def process_link_code(message: Message, user):
     code    = message.text.strip().upper()
     chat_id = message.chat.id
 
-    # Не обробляти якщо вже прив'язаний
-    if get_user_by_chat_id(chat_id):
+    # Не обробляти якщо вже прив'язаний (юзер з кешу - без запиту до БД)
+    if user:
         return
 
-    with Session() as cursor:
+    async with AsyncSession() as cursor:
         # Шукаємо код в таблиці телеграм-кодів
-        tg_code = cursor.query(TelegramCode).filter_by(code=code).first()
+        tg_code = await cursor.scalar(select(TelegramCode).filter_by(code=code))
 
         if not tg_code:
             await message.answer("❌ Невірний код. Перевірте і спробуйте ще раз.")
@@ -72,17 +66,22 @@ async def process_link_code(message: Message):
 
         age = (datetime.utcnow() - tg_code.created_at).seconds
         if age > 600:
-            cursor.delete(tg_code)
-            cursor.commit()
+            await cursor.delete(tg_code)
+            await cursor.commit()
             await message.answer("⏱ Код застарів. Отримайте новий на сайті.")
             return
 
-        user = cursor.query(Users).filter_by(id=tg_code.user_id).first()
-        user.telegram_chat_id = chat_id
-        cursor.delete(tg_code)
-        cursor.commit()
+        linked = await cursor.get(Users, tg_code.user_id)
+        linked.telegram_chat_id = chat_id
+        await cursor.delete(tg_code)
+        # Інші воркери теж пам'ятають цей чат як неприв'язаний
+        await notify_bot_identity(cursor, chat_id)
+        await cursor.commit()
+
+        nickname = linked.nickname
 
-        nickname = user.nickname
+    # Свій кеш - одразу, не чекаючи NOTIFY
+    identity_cache.invalidate(chat_id)
 
     await message.answer(
         f"✅ Акаунт *{nickname}* успішно прив'язано!",
@@ -1,10 +1,12 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
+from datetime import datetime
 
-from shared.db import Session, Users, Orders, Reservation, Menu
-from sqlalchemy.orm import joinedload
+from shared.db import AsyncSession, Orders, OrderItem, Reservation, Menu
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
 from bot.keyboards import main_keyboard, confirm_cancel_keyboard, ADMIN_CHAT_ID
-from web.app import email_user_cancelled_reservation, ADMIN_EMAIL, app
+from web.app import email_user_cancelled_reservation, ADMIN_EMAIL
 
 router = Router()
 
@@ -16,35 +18,33 @@ STATUS_LABELS = {
 }
 
 
-def get_user_by_chat_id(chat_id: int):
-    """Шукає юзера в БД по його chat_id"""
-    with Session() as cursor:
-        return cursor.query(Users).filter_by(telegram_chat_id=chat_id).first()
-
 # Трекер замовлення
 @router.message(F.text == '📦 Моє замовлення')
-async def my_order(message: Message):
-    user = get_user_by_chat_id(message.chat.id)
+async def my_order(message: Message, user):
     if not user:
         await message.answer("❌ Акаунт не прив'язано.")
         return
 
-    with Session() as cursor:
-        order = cursor.query(Orders)\
-            .filter_by(user_id=user.id)\
-            .order_by(Orders.order_time.desc())\
-            .first()
+    async with AsyncSession() as cursor:
+        order = await cursor.scalar(
+            select(Orders)
+            .options(selectinload(Orders.items).joinedload(OrderItem.menu))
+            .filter_by(user_id=user.id)
+            .order_by(Orders.order_time.desc())
+            .limit(1)
+        )
 
         if not order:
             await message.answer("У вас ще немає замовлень.")
             return
 
-        items  = '\n'.join(f"  • {name} × {qty}" for name, qty in order.order_list.items())
+        items  = '\n'.join(f"  • {item.name} × {item.qty}" for item in order.items)
         status = STATUS_LABELS.get(order.status, order.status)
 
     await message.answer(
         f"📦 *Замовлення #{order.id}*\n\n"
         f"{items}\n\n"
+        f"Сума: {order.total} грн\n"
         f"Статус: *{status}*\n"
         f"Час: {order.order_time.strftime('%d.%m.%Y %H:%M')}",
         parse_mode='Markdown'
@@ -52,24 +52,26 @@ async def my_order(message: Message):
 
 
 @router.message(F.text == '🪑 Моє бронювання')
-async def my_reservation(message: Message):
-    user = get_user_by_chat_id(message.chat.id)
+async def my_reservation(message: Message, user):
     if not user:
         await message.answer("❌ Акаунт не прив'язано.")
         return
 
-    with Session() as cursor:
-        res = cursor.query(Reservation)\
-            .options(joinedload(Reservation.table))\
-            .filter_by(user_id=user.id)\
-            .first()
+    async with AsyncSession() as cursor:
+        res = await cursor.scalar(
+            select(Reservation)
+            .options(joinedload(Reservation.table))
+            .filter(Reservation.user_id == user.id, Reservation.time_end > datetime.now())
+            .order_by(Reservation.time_start)
+            .limit(1)
+        )
 
         if not res:
             await message.answer("У вас немає активних бронювань.")
             return
 
         text = (
-            f"🪑 *Ваше бронювання*\n\n"
+            f"🪑 *Ваше найближче бронювання*\n\n"
             f"Столик №{res.table.number} — {res.table.label}\n"
             f"Тип: {res.table.type_table} ос.\n"
             f"Час: {res.time_start.strftime('%d.%m.%Y %H:%M')}"
@@ -82,17 +84,19 @@ async def my_reservation(message: Message):
 
 
 @router.message(F.text == '❌ Скасувати бронювання')
-async def cancel_reservation(message: Message):
-    user = get_user_by_chat_id(message.chat.id)
+async def cancel_reservation(message: Message, user):
     if not user:
         await message.answer("❌ Акаунт не прив'язано.")
         return
 
-    with Session() as cursor:
-        res = cursor.query(Reservation)\
-            .options(joinedload(Reservation.table))\
-            .filter_by(user_id=user.id)\
-            .first()
+    async with AsyncSession() as cursor:
+        res = await cursor.scalar(
+            select(Reservation)
+            .options(joinedload(Reservation.table))
+            .filter(Reservation.user_id == user.id, Reservation.time_end > datetime.now())
+            .order_by(Reservation.time_start)
+            .limit(1)
+        )
 
         if not res:
             await message.answer("У вас немає активних бронювань.")
@@ -112,10 +116,12 @@ async def cancel_reservation(message: Message):
 async def confirm_cancel(call: CallbackQuery):
     res_id = int(call.data.split(':')[1])
 
-    with Session() as cursor:
-        res = cursor.query(Reservation)\
-            .options(joinedload(Reservation.table), joinedload(Reservation.user))\
-            .filter_by(id=res_id).first()
+    async with AsyncSession() as cursor:
+        res = await cursor.scalar(
+            select(Reservation)
+            .options(joinedload(Reservation.table), joinedload(Reservation.user))
+            .filter_by(id=res_id)
+        )
         if res:
             table_number = res.table.number
             table_label = res.table.label
@@ -123,18 +129,17 @@ async def confirm_cancel(call: CallbackQuery):
             user_nickname = res.user.nickname
             user_email = res.user.email
 
-            cursor.delete(res)
-            cursor.commit()
-
-    with app.app_context():
-        email_user_cancelled_reservation(
-            admin_email=ADMIN_EMAIL,
-            user_nickname=user_nickname,
-            user_email=user_email,
-            table_number=table_number,
-            table_label=table_label,
-            time_start=time_start
-        )
+            await cursor.delete(res)
+            email_user_cancelled_reservation(
+                admin_email=ADMIN_EMAIL,
+                user_nickname=user_nickname,
+                user_email=user_email,
+                table_number=table_number,
+                table_label=table_label,
+                time_start=time_start,
+                cursor=cursor
+            )
+            await cursor.commit()
 
     await call.message.edit_text("✅ Бронювання скасовано.")
 
@@ -146,8 +151,8 @@ async def cancel_no(call: CallbackQuery):
 
 @router.message(F.text == '☰ Меню')
 async def show_menu(message: Message):
-    with Session() as cursor:
-        positions = cursor.query(Menu).filter_by(active=True).all()
+    async with AsyncSession() as cursor:
+        positions = (await cursor.scalars(select(Menu).filter_by(active=True))).all()
 
         if not positions:
             await message.answer("Меню порожнє.")
@@ -155,6 +160,7 @@ async def show_menu(message: Message):
 
         text = "🍽 *Меню Останнього Прихистку:*\n\n"
         for p in positions:
-            text += f"• *{p.name}* — {p.price} ₴ ({p.weight} г)\n"
+            rating = f" ⭐ {p.avg_rating}" if p.avg_rating else ""
+            text += f"• *{p.name}* — {p.price} ₴ ({p.weight} г){rating}\n"
 
     await message.answer(text, parse_mode='Markdown')
\ No newline at end of file
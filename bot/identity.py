@@ -0,0 +1,106 @@
+from aiogram import BaseMiddleware
+from collections import OrderedDict, namedtuple
+from sqlalchemy import select
+from time import monotonic
+import asyncio
+import asyncpg
+
+from shared.db import AsyncSession, Users, async_engine, BOT_IDENTITY_CHANNEL
+
+
+# Те, що хендлерам треба знати про юзера - без живого ORM-об'єкта і сесії
+BotUser = namedtuple('BotUser', ['id', 'nickname', 'email'])
+
+IDENTITY_TTL      = 300       # страховка, якщо NOTIFY з сайту не дійшов
+IDENTITY_MAX_SIZE = 10000
+IDENTITY_PING     = 60        # як часто перевіряти, що LISTEN-з'єднання живе
+IDENTITY_BACKOFF  = 60        # найдовша пауза між спробами перепідключитись
+
+
+class IdentityCache:
+    """
+    LRU + TTL кеш chat_id -> BotUser (або None для неприв'язаних чатів).
+    Звичайне натискання кнопки не робить жодного запиту до users.
+    """
+
+    def __init__(self, ttl=IDENTITY_TTL, max_size=IDENTITY_MAX_SIZE):
+        self.ttl      = ttl
+        self.max_size = max_size
+        self._items   = OrderedDict()     # chat_id -> (expires_at, user)
+
+    def invalidate(self, chat_id):
+        self._items.pop(chat_id, None)
+
+    def clear(self):
+        self._items.clear()
+
+    async def resolve(self, chat_id):
+        cached = self._items.get(chat_id)
+        if cached and cached[0] > monotonic():
+            self._items.move_to_end(chat_id)
+            return cached[1]
+
+        async with AsyncSession() as cursor:
+            row = (await cursor.execute(
+                select(Users.id, Users.nickname, Users.email).filter_by(telegram_chat_id=chat_id)
+            )).first()
+
+        user = BotUser(*row) if row else None
+        self._items[chat_id] = (monotonic() + self.ttl, user)
+        self._items.move_to_end(chat_id)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return user
+
+
+identity_cache = IdentityCache()
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """Кладе прив'язаного юзера (або None) у data['user'] - хендлер отримує його аргументом."""
+
+    async def __call__(self, handler, event, data):
+        chat = data.get('event_chat')
+        data['user'] = await identity_cache.resolve(chat.id) if chat else None
+        return await handler(event, data)
+
+
+async def listen_identity_changes():
+    """
+    Слухає NOTIFY (прив'язка в боті, відв'язка й видалення юзера на сайті) і скидає кеш для chat_id.
+    Працює, поки бот не зупинить задачу. Обірване з'єднання відкривається знову з паузою,
+    що росте до IDENTITY_BACKOFF; після кожного підключення кеш очищується - NOTIFY,
+    що прийшли без з'єднання, загубились.
+    """
+    # Параметри з'єднання - ті самі, що в пулу async_engine
+    cargs, cparams = async_engine.sync_engine.dialect.create_connect_args(async_engine.url)
+    delay = 1
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(*cargs, **cparams)
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda conn: closed.set())
+            await connection.add_listener(
+                BOT_IDENTITY_CHANNEL,
+                lambda conn, pid, channel, payload: identity_cache.invalidate(int(payload))
+            )
+            identity_cache.clear()
+            delay = 1
+
+            while not closed.is_set():
+                try:
+                    await asyncio.wait_for(closed.wait(), IDENTITY_PING)
+                except asyncio.TimeoutError:
+                    # Напіввідкрите TCP-з'єднання саме не закриється - перевіряємо запитом
+                    await connection.fetchval("SELECT 1", timeout=10)
+            print("[IDENTITY] LISTEN-з'єднання закрилось")
+        except Exception as e:
+            print(f"[IDENTITY] LISTEN: {e!r}")
+        finally:
+            if connection:
+                connection.terminate()
+
+        print(f"[IDENTITY] перепідключення через {delay} с")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, IDENTITY_BACKOFF)
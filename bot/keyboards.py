@@ -33,8 +33,19 @@ def confirm_cancel_keyboard(res_id: int) -> InlineKeyboardMarkup:
     ]])
 
 
-def order_status_keyboard(order_id: int, next_status: str, next_label: str) -> InlineKeyboardMarkup:
+def order_status_button(order_id: int, next_status: str, next_label: str) -> InlineKeyboardButton:
     """Кнопка зміни статусу замовлення для адміна."""
-    return InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text=f'→ {next_label}', callback_data=f'status:{order_id}:{next_status}'),
-    ]])
\ No newline at end of file
+    return InlineKeyboardButton(text=f'#{order_id} → {next_label}', callback_data=f'status:{order_id}:{next_status}')
+
+
+def page_keyboard(list_name: str, prev_key: str = None, next_key: str = None, rows=()) -> InlineKeyboardMarkup:
+    """Кнопки рядків сторінки + ◀️/▶️ для гортання списку (ключі - keyset-курсори)."""
+    nav = []
+    if prev_key:
+        nav.append(InlineKeyboardButton(text='◀️ Назад', callback_data=f'page:{list_name}:prev:{prev_key}'))
+    if next_key:
+        nav.append(InlineKeyboardButton(text='Далі ▶️', callback_data=f'page:{list_name}:next:{next_key}'))
+    keyboard = [list(row) for row in rows]
+    if nav:
+        keyboard.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
\ No newline at end of file
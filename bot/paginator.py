@@ -0,0 +1,172 @@
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from time import monotonic
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from sqlalchemy import select, func, tuple_
+
+from shared.db import AsyncSession
+from bot.keyboards import page_keyboard
+
+
+MESSAGE_LIMIT   = 4096    # ліміт Telegram на текст повідомлення
+EDIT_INTERVAL   = 1.0     # не частіше одного редагування сторінки на секунду
+OPEN_PAGES_MAX  = 500
+KEY_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+Page = namedtuple('Page', ['rows', 'total', 'has_prev', 'has_next'])
+
+
+def encode_key(moment, row_id):
+    """(час, id) -> компактний рядок для callback_data (ліміт 64 байти)."""
+    return f"{moment.strftime(KEY_TIME_FORMAT)}.{row_id}"
+
+
+def decode_key(key):
+    moment, row_id = key.split('.')
+    return datetime.strptime(moment, KEY_TIME_FORMAT), int(row_id)
+
+
+class Paginator:
+    """
+    Список для адмін-чату сторінками по page_size рядків в одному повідомленні.
+
+    Гортання - keyset по (time_column, id_column): кнопки ◀️/▶️ несуть ключ
+    крайнього рядка, тож сторінка не залежить від OFFSET і не «з'їжджає»,
+    коли в списку з'являються нові рядки. Перша сторінка надсилається новим
+    повідомленням, далі воно лише редагується.
+    """
+
+    def __init__(self, name, query, time_column, id_column, render, title, empty_text,
+                 page_size=10, descending=False):
+        self.name        = name
+        self.query       = query          # () -> select(...) з фільтрами, без order_by
+        self.time_column = time_column
+        self.id_column   = id_column
+        self.render      = render         # (rows) -> (text, рядки inline-кнопок)
+        self.title       = title          # з {total} - кількість рядків у всьому списку
+        self.empty_text  = empty_text
+        self.page_size   = page_size
+        self.descending  = descending
+        # (chat_id, message_id) -> (ключ першого рядка, час останнього редагування, total)
+        self._open_pages = OrderedDict()
+
+    async def fetch(self, cursor, key=None, backwards=False, inclusive=False, total=None):
+        """total - вже відомий COUNT відкритого списку; None - порахувати заново."""
+        stmt       = self.query()
+        sort_key   = tuple_(self.time_column, self.id_column)
+        descending = self.descending != backwards
+
+        if key is not None:
+            if descending:
+                stmt = stmt.filter(sort_key <= key if inclusive else sort_key < key)
+            else:
+                stmt = stmt.filter(sort_key >= key if inclusive else sort_key > key)
+
+        columns = (self.time_column, self.id_column)
+        stmt = stmt.order_by(*(c.desc() for c in columns) if descending else columns)\
+                   .limit(self.page_size + 1)
+
+        rows  = list((await cursor.scalars(stmt)).all())
+        more  = len(rows) > self.page_size
+        rows  = rows[:self.page_size]
+        if total is None:
+            total = await cursor.scalar(select(func.count()).select_from(self.query().subquery()))
+
+        if backwards:
+            rows.reverse()
+            return Page(rows, total, has_prev=more, has_next=True)
+
+        has_prev = key is not None
+        if inclusive and key is not None:
+            # Перемальовуємо ту саму сторінку - чи є щось перед нею, треба перевірити
+            before = self.query().filter(sort_key > key if descending else sort_key < key)
+            has_prev = await cursor.scalar(select(before.exists()))
+        return Page(rows, total, has_prev=has_prev, has_next=more)
+
+    def _row_key(self, row):
+        return encode_key(getattr(row, self.time_column.key), getattr(row, self.id_column.key))
+
+    def _build(self, page):
+        # Обрізка посеред тексту може розірвати *жирний* - тоді Telegram відхилить Markdown.
+        # Тому відкидаємо цілі рядки з кінця, а ▶️ продовжить з останнього показаного
+        shown = page.rows
+        while True:
+            text, rows = self.render(shown)
+            text = self.title.format(total=page.total) + "\n\n" + text
+            if len(text) <= MESSAGE_LIMIT or len(shown) == 1:
+                break
+            shown = shown[:-1]
+        if len(text) > MESSAGE_LIMIT:
+            # Навіть один рядок не влазить - ріжемо по межі рядка тексту
+            cut  = text.rfind('\n', 0, MESSAGE_LIMIT - 1)
+            text = text[:cut if cut > 0 else MESSAGE_LIMIT - 1] + '…'
+
+        keyboard = page_keyboard(
+            self.name,
+            prev_key=self._row_key(shown[0])  if page.has_prev else None,
+            next_key=self._row_key(shown[-1]) if page.has_next or len(shown) < len(page.rows) else None,
+            rows=rows,
+        )
+        return text, keyboard
+
+    def _remember(self, message, page):
+        slot = (message.chat.id, message.message_id)
+        self._open_pages[slot] = (decode_key(self._row_key(page.rows[0])), monotonic(), page.total)
+        self._open_pages.move_to_end(slot)
+        if len(self._open_pages) > OPEN_PAGES_MAX:
+            self._open_pages.popitem(last=False)
+
+    async def send(self, message):
+        """Перша сторінка - новим повідомленням."""
+        async with AsyncSession() as cursor:
+            page = await self.fetch(cursor)
+            if not page.rows:
+                await message.answer(self.empty_text)
+                return
+            text, keyboard = self._build(page)
+
+        sent = await message.answer(text, parse_mode='Markdown', reply_markup=keyboard)
+        self._remember(sent, page)
+
+    async def turn(self, call, direction, key):
+        """Обробник кнопок ◀️/▶️."""
+        await self._edit(call, decode_key(key), backwards=direction == 'prev')
+
+    async def refresh(self, call, notice=None):
+        """Перемальовує сторінку на місці - наприклад, після зміни статусу рядка."""
+        opened = self._open_pages.get((call.message.chat.id, call.message.message_id))
+        await self._edit(call, opened[0] if opened else None, inclusive=True, throttle=False, notice=notice)
+
+    async def _edit(self, call, key, backwards=False, inclusive=False, throttle=True, notice=None):
+        slot   = (call.message.chat.id, call.message.message_id)
+        opened = self._open_pages.get(slot)
+        if throttle and opened and monotonic() - opened[1] < EDIT_INTERVAL:
+            await call.answer("⏳ Зачекайте секунду...")
+            return
+
+        async with AsyncSession() as cursor:
+            # Гортання бере total з відкритої сторінки; refresh (inclusive) рахує заново - рядки змінились
+            total = opened[2] if opened and not inclusive else None
+            page  = await self.fetch(cursor, key, backwards=backwards, inclusive=inclusive, total=total)
+            if not page.rows and key is not None:
+                # Рядки зникли (доставлені/видалені) - показуємо з початку
+                page = await self.fetch(cursor)
+            if not page.rows:
+                text, keyboard = self.empty_text, None
+            else:
+                text, keyboard = self._build(page)
+
+        try:
+            await call.message.edit_text(text, parse_mode='Markdown', reply_markup=keyboard)
+        except TelegramRetryAfter as e:
+            await call.answer(f"⏳ Забагато запитів, спробуйте через {e.retry_after} с.")
+            return
+        except TelegramBadRequest as e:
+            # Натиснули ту саму сторінку - текст не змінився, це не помилка
+            if 'message is not modified' not in str(e):
+                raise
+
+        if page.rows:
+            self._remember(call.message, page)
+        await call.answer(notice)
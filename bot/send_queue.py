@@ -0,0 +1,160 @@
+from collections import deque, Counter
+from time import monotonic
+import asyncio
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError
+from dotenv import load_dotenv
+import os
+
+
+load_dotenv()
+TELEGRAM_RATE_PER_SECOND = float(os.getenv('TELEGRAM_RATE_PER_SECOND', 25))   # глобальний ліміт Telegram ~30/с
+TELEGRAM_CHAT_INTERVAL   = float(os.getenv('TELEGRAM_CHAT_INTERVAL', 1))       # ~1 повідомлення/с в один чат
+SEND_WORKERS             = 4
+SEND_MAX_ATTEMPTS        = 5
+METRICS_EVERY_SECONDS    = 60
+
+
+class TokenBucket:
+    """Token bucket для asyncio; pause() зупиняє всі відправки після flood-wait від Telegram."""
+
+    def __init__(self, rate):
+        self.rate          = rate
+        self._tokens       = rate
+        self._last         = monotonic()
+        self._paused_until = 0.0
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+
+    async def acquire(self):
+        while True:
+            now = monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SendQueue:
+    """
+    Черга вихідних повідомлень бота юзерам.
+
+    Кожен чат має свою FIFO-чергу і обробляється одним воркером за раз,
+    тож повідомлення в чаті приходять по порядку і не частіше chat_interval.
+    Глобальну швидкість тримає TokenBucket. TelegramRetryAfter не губить
+    повідомлення: воно лишається першим у черзі чату, а вся відправка
+    ставиться на паузу на retry_after секунд.
+    """
+
+    def __init__(self, rate=TELEGRAM_RATE_PER_SECOND, chat_interval=TELEGRAM_CHAT_INTERVAL,
+                 workers=SEND_WORKERS, max_attempts=SEND_MAX_ATTEMPTS):
+        self.chat_interval = chat_interval
+        self.workers       = workers
+        self.max_attempts  = max_attempts
+        self.bucket        = TokenBucket(rate)
+        self.metrics       = Counter()          # queued / sent / retried / failed
+        self._chats        = {}                 # chat_id -> deque([kwargs, спроби])
+        self._next_at      = {}                 # chat_id -> коли можна писати в чат знову
+        self._ready        = asyncio.Queue()    # чати, з яких можна брати наступне повідомлення
+        self._bot          = None
+        self._tasks        = []
+
+    @property
+    def depth(self):
+        """Скільки повідомлень чекає на відправку."""
+        return sum(len(messages) for messages in self._chats.values())
+
+    def stats(self):
+        return {**self.metrics, 'depth': self.depth, 'chats': len(self._chats)}
+
+    def start(self, bot):
+        self._bot   = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._report()))
+
+    async def stop(self, timeout=10):
+        """Дає черзі дочитатись (не довше timeout секунд) і зупиняє воркери."""
+        deadline = monotonic() + timeout
+        while self._chats and monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._chats:
+            print(f"[SEND QUEUE] не відправлено при зупинці: {self.depth}")
+
+    def notify(self, chat_id, text, **kwargs):
+        """Ставить повідомлення в чергу і одразу повертає керування хендлеру."""
+        messages = self._chats.get(chat_id)
+        if messages is None:
+            messages = self._chats[chat_id] = deque()
+            self._schedule(chat_id)
+        messages.append([dict(chat_id=chat_id, text=text, **kwargs), 0])
+        self.metrics['queued'] += 1
+
+    def _schedule(self, chat_id):
+        delay = self._next_at.get(chat_id, 0) - monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id  = await self._ready.get()
+            messages = self._chats[chat_id]
+            message  = messages[0]
+
+            await self.bucket.acquire()
+            try:
+                await self._bot.send_message(**message[0])
+            except TelegramRetryAfter as e:
+                # Flood-wait стосується всього бота - пригальмовуємо всіх
+                self.bucket.pause(e.retry_after)
+                self._next_at[chat_id] = monotonic() + e.retry_after
+                self.metrics['retried'] += 1
+                self._schedule(chat_id)
+                continue
+            except TelegramNetworkError as e:
+                message[1] += 1
+                if message[1] < self.max_attempts:
+                    self._next_at[chat_id] = monotonic() + 2 ** message[1]
+                    self.metrics['retried'] += 1
+                    self._schedule(chat_id)
+                    continue
+                print(f"[SEND QUEUE] {chat_id}: {e}")
+                self.metrics['failed'] += 1
+            except Exception as e:
+                # Юзер заблокував бота, чат не знайдено тощо - повтор не допоможе,
+                # а воркер не має падати через одне повідомлення
+                print(f"[SEND QUEUE] {chat_id}: {e}")
+                self.metrics['failed'] += 1
+            else:
+                self.metrics['sent'] += 1
+
+            messages.popleft()
+            self._next_at[chat_id] = monotonic() + self.chat_interval
+            if messages:
+                self._schedule(chat_id)
+            else:
+                del self._chats[chat_id]
+
+    async def _report(self):
+        """Раз на хвилину: метрики в лог, якщо черга не порожня, і чистка старих пауз чатів."""
+        while True:
+            await asyncio.sleep(METRICS_EVERY_SECONDS)
+            now = monotonic()
+            self._next_at = {chat_id: at for chat_id, at in self._next_at.items()
+                             if at > now or chat_id in self._chats}
+            if self._chats:
+                print(f"[SEND QUEUE] {self.stats()}")
+
+
+send_queue = SendQueue()
@@ -0,0 +1,152 @@
+from datetime import timedelta
+import asyncio
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from sqlalchemy import select, delete, func, case, text
+from sqlalchemy.dialects.postgresql import insert
+from dotenv import load_dotenv
+import os
+
+from shared.db import AsyncSession, FsmState
+
+
+load_dotenv()
+FSM_TTL                = timedelta(hours=float(os.getenv('FSM_TTL_HOURS', 24)))   # недописана страва живе добу
+FSM_CLEANUP_SECONDS    = 600
+FSM_CLEANUP_BATCH      = 1000
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM-сховище aiogram у нашому ж Postgres: один рядок (state + JSONB data) на чат/юзера.
+
+    Кожен запис продовжує expires_at на FSM_TTL; прострочені рядки не читаються
+    і видаляються фоновою чисткою пачками. Порожній рядок (немає ні стану, ні даних)
+    видаляється одразу, тож таблиця містить тільки незавершені діалоги.
+    """
+
+    def __init__(self, ttl=FSM_TTL):
+        self.ttl          = ttl
+        self.key_builder  = DefaultKeyBuilder(with_destiny=True)
+        self._cleanup_task = None
+
+    def _key(self, key):
+        return self.key_builder.build(key)
+
+    def _expires_at(self):
+        return func.now() + self.ttl
+
+    @staticmethod
+    def _alive():
+        return FsmState.expires_at > func.now()
+
+    async def _drop_if_empty(self, cursor, key):
+        await cursor.execute(
+            delete(FsmState)
+            .where(FsmState.key == key, FsmState.state.is_(None), FsmState.data == text("'{}'::jsonb"))
+        )
+
+    async def set_state(self, key, state=None):
+        key   = self._key(key)
+        state = state.state if isinstance(state, State) else state
+
+        stmt = insert(FsmState).values(key=key, state=state, data={}, expires_at=self._expires_at())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FsmState.key],
+            set_={
+                'state':      stmt.excluded.state,
+                # Дані простроченого діалогу не воскрешаємо
+                'data':       case((self._alive(), FsmState.data), else_=stmt.excluded.data),
+                'expires_at': stmt.excluded.expires_at,
+            },
+        )
+        async with AsyncSession() as cursor:
+            await cursor.execute(stmt)
+            if state is None:
+                await self._drop_if_empty(cursor, key)
+            await cursor.commit()
+
+    async def get_state(self, key):
+        async with AsyncSession() as cursor:
+            return await cursor.scalar(
+                select(FsmState.state).where(FsmState.key == self._key(key), self._alive())
+            )
+
+    async def set_data(self, key, data):
+        key  = self._key(key)
+        data = dict(data)
+
+        stmt = insert(FsmState).values(key=key, state=None, data=data, expires_at=self._expires_at())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FsmState.key],
+            set_={
+                'state':      case((self._alive(), FsmState.state), else_=None),
+                'data':       stmt.excluded.data,
+                'expires_at': stmt.excluded.expires_at,
+            },
+        )
+        async with AsyncSession() as cursor:
+            await cursor.execute(stmt)
+            if not data:
+                await self._drop_if_empty(cursor, key)
+            await cursor.commit()
+
+    async def get_data(self, key):
+        async with AsyncSession() as cursor:
+            data = await cursor.scalar(
+                select(FsmState.data).where(FsmState.key == self._key(key), self._alive())
+            )
+        return dict(data) if data else {}
+
+    async def update_data(self, key, data):
+        """Злиття JSONB (data || patch) одним запитом, замість get_data + set_data."""
+        stmt = insert(FsmState).values(key=self._key(key), state=None, data=dict(data),
+                                       expires_at=self._expires_at())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FsmState.key],
+            set_={
+                'state':      case((self._alive(), FsmState.state), else_=None),
+                'data':       case((self._alive(), FsmState.data.op('||')(stmt.excluded.data)),
+                                   else_=stmt.excluded.data),
+                'expires_at': stmt.excluded.expires_at,
+            },
+        ).returning(FsmState.data)
+
+        async with AsyncSession() as cursor:
+            merged = await cursor.scalar(stmt)
+            await cursor.commit()
+        return dict(merged)
+
+    async def cleanup(self, batch_size=FSM_CLEANUP_BATCH):
+        """Видаляє прострочені стани пачками; SKIP LOCKED - кілька воркерів не заважають один одному."""
+        removed = 0
+        while True:
+            expired = select(FsmState.key)\
+                .where(FsmState.expires_at <= func.now())\
+                .limit(batch_size)\
+                .with_for_update(skip_locked=True)
+            async with AsyncSession() as cursor:
+                result = await cursor.execute(delete(FsmState).where(FsmState.key.in_(expired)))
+                await cursor.commit()
+            removed += result.rowcount
+            if result.rowcount < batch_size:
+                return removed
+
+    async def _cleanup_loop(self, interval):
+        while True:
+            try:
+                removed = await self.cleanup()
+                if removed:
+                    print(f"[FSM] видалено прострочених станів: {removed}")
+            except Exception as e:
+                print(f"[FSM CLEANUP ERROR] {e}")
+            await asyncio.sleep(interval)
+
+    def start_cleanup(self, interval=FSM_CLEANUP_SECONDS):
+        self._cleanup_task = asyncio.create_task(self._cleanup_loop(interval))
+
+    async def close(self):
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
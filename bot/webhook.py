@@ -0,0 +1,103 @@
+from multiprocessing import Process
+import asyncio
+import hmac
+
+from aiohttp import web
+from aiogram.types import Update
+from dotenv import load_dotenv
+import os
+
+from bot.bot import bot, dp, start_services, stop_services, MAX_CONCURRENT_UPDATES
+from bot.send_queue import send_queue, TokenBucket, TELEGRAM_RATE_PER_SECOND
+
+
+load_dotenv()
+WEBHOOK_URL     = os.getenv('WEBHOOK_URL')                 # публічна адреса, напр. https://shelter.example.com
+WEBHOOK_PATH    = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET  = os.getenv('WEBHOOK_SECRET')              # обов'язковий: без нього апдейт підробить будь-хто
+WEBHOOK_HOST    = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT    = int(os.getenv('WEBHOOK_PORT', 8081))
+BOT_WORKERS     = int(os.getenv('BOT_WORKERS', 1))
+SECRET_HEADER   = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+async def handle_update(request):
+    """
+    Один апдейт від Telegram. Обробляємо прямо в запиті під семафором:
+    коли всі слоти зайняті, Telegram просто чекає відповіді - черга не росте в пам'яті.
+    """
+    # Інакше будь-хто надішле апдейт від імені ADMIN_CHAT_ID і пройде перевірки адміна
+    if not hmac.compare_digest(request.headers.get(SECRET_HEADER, '').encode(), WEBHOOK_SECRET.encode()):
+        return web.Response(status=401)
+
+    try:
+        update = Update.model_validate(await request.json(), context={'bot': bot})
+    except ValueError:
+        return web.Response(status=400)
+
+    async with request.app['updates']:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            # 200 все одно: інакше Telegram повторюватиме той самий апдейт
+            print(f"[WEBHOOK ERROR] update {update.update_id}: {e}")
+    return web.Response()
+
+
+async def on_startup(app):
+    app['updates']  = asyncio.Semaphore(MAX_CONCURRENT_UPDATES)
+    app['listener'] = await start_services()
+
+
+async def on_cleanup(app):
+    await stop_services(app['listener'])
+    await bot.session.close()
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def register_webhook(workers):
+    """Реєструє webhook один раз з головного процесу, а не з кожного воркера."""
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=min(100, workers * MAX_CONCURRENT_UPDATES),
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    await bot.session.close()
+
+
+def serve(workers):
+    # Ліміт Telegram спільний на весь бот - ділимо його між воркерами
+    send_queue.bucket = TokenBucket(TELEGRAM_RATE_PER_SECOND / workers)
+    web.run_app(create_app(), host=WEBHOOK_HOST, port=WEBHOOK_PORT,
+                reuse_port=workers > 1, print=None)
+
+
+def run_webhook(workers=BOT_WORKERS):
+    """
+    Запускає workers процесів на одному порту (SO_REUSEPORT - ядро розподіляє з'єднання).
+    Без WEBHOOK_URL webhook у Telegram не реєструється - зручно для локальних тестів.
+    Без WEBHOOK_SECRET не стартує зовсім: запити без секрету ніхто б не відрізнив від Telegram.
+    """
+    if not WEBHOOK_SECRET:
+        raise SystemExit("WEBHOOK_SECRET не задано - webhook без секрету не запускаємо")
+    if WEBHOOK_URL:
+        asyncio.run(register_webhook(workers))
+
+    print(f"☢ Бот запущено (webhook :{WEBHOOK_PORT}{WEBHOOK_PATH}, воркерів: {workers})...")
+    if workers == 1:
+        serve(workers)
+        return
+
+    processes = [Process(target=serve, args=(workers,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
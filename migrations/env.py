@@ -0,0 +1,34 @@
+from alembic import context
+
+from shared.db import Base, engine
+
+
+# Моделі - для alembic revision --autogenerate; підключення - той самий engine, що й у сайту
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    """alembic upgrade head --sql - SQL-скрипт для ручного запуску замість підключення."""
+    context.configure(url=engine.url.render_as_string(hide_password=False),
+                      target_metadata=target_metadata,
+                      literal_binds=True,
+                      transaction_per_migration=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        # Кожна міграція у своїй транзакції: CREATE INDEX CONCURRENTLY іде в autocommit_block
+        context.configure(connection=connection,
+                          target_metadata=target_metadata,
+                          transaction_per_migration=True,
+                          compare_type=True)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,33 @@
+"""Повнотекстовий і триграмний пошук по меню (/api/menu)
+
+Revision ID: 0002_menu_search
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0002_menu_search'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('menu', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(ingredients, '') || ' ' || coalesce(description, ''))",
+        persisted=True), nullable=False), if_not_exists=True)
+    # Меню - десятки рядків, CONCURRENTLY тут не потрібен
+    op.create_index('ix_menu_search_vector', 'menu', ['search_vector'], unique=False,
+                    postgresql_using='gin', if_not_exists=True)
+    op.create_index('ix_menu_name_trgm', 'menu', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_menu_name_trgm', table_name='menu')
+    op.drop_index('ix_menu_search_vector', table_name='menu')
+    op.drop_column('menu', 'search_vector')
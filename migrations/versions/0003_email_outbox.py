@@ -0,0 +1,37 @@
+"""Черга листів email_outbox (доставляє run_mail_worker.py)
+
+Revision ID: 0003_email_outbox
+Revises: 0002_menu_search
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003_email_outbox'
+down_revision = '0002_menu_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('email_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recipient', sa.String(length=100), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=False),
+    sa.Column('body_html', sa.String(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_email_outbox_pending', 'email_outbox', ['next_attempt_at'], unique=False,
+                    postgresql_where=sa.text("status = 'pending'"), if_not_exists=True)
+
+
+def downgrade():
+    op.drop_table('email_outbox')
@@ -0,0 +1,35 @@
+"""Розсилки про нові страви - broadcast_campaigns з чекпойнтом прогресу
+
+Revision ID: 0004_broadcast_campaigns
+Revises: 0003_email_outbox
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004_broadcast_campaigns'
+down_revision = '0003_email_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('broadcast_campaigns',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=False),
+    sa.Column('body_html', sa.String(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('last_user_id', sa.Integer(), nullable=False),
+    sa.Column('sent_count', sa.Integer(), nullable=False),
+    sa.Column('failed_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('broadcast_campaigns')
@@ -0,0 +1,28 @@
+"""Агрегати рейтингу rating_count / rating_sum на стравах
+
+Revision ID: 0005_menu_ratings
+Revises: 0004_broadcast_campaigns
+Create Date: 2026-10-18
+
+Значення для вже залишених відгуків рахує `python backfill_ratings.py` (один раз після міграції).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005_menu_ratings'
+down_revision = '0004_broadcast_campaigns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('menu', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False),
+                  if_not_exists=True)
+    op.add_column('menu', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False),
+                  if_not_exists=True)
+
+
+def downgrade():
+    op.drop_column('menu', 'rating_sum')
+    op.drop_column('menu', 'rating_count')
@@ -0,0 +1,58 @@
+"""Бронювання з тривалістю - reservation.time_end та індекс (table_id, time_start)
+
+Revision ID: 0006_reservation_time_end
+Revises: 0005_menu_ratings
+Create Date: 2026-10-18
+
+Старі броні тривалості не мали - вважаємо їх двогодинними (DEFAULT_DURATION на момент переходу).
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = '0006_reservation_time_end'
+down_revision = '0005_menu_ratings'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+BACKFILL_SQL = """
+    UPDATE reservation SET time_end = time_start + interval '2 hours'
+    WHERE time_end IS NULL {batch}
+"""
+
+
+def upgrade():
+    op.add_column('reservation', sa.Column('time_end', sa.DateTime(), nullable=True), if_not_exists=True)
+
+    if context.is_offline_mode():
+        op.execute(BACKFILL_SQL.format(batch=''))
+    else:
+        conn = op.get_bind()
+        # Пачками з комітом після кожної - не тримаємо блокування на всіх бронях одразу
+        with op.get_context().autocommit_block():
+            while conn.execute(sa.text(BACKFILL_SQL.format(
+                    batch='AND id IN (SELECT id FROM reservation WHERE time_end IS NULL LIMIT :batch)')),
+                    {"batch": BATCH_SIZE}).rowcount:
+                pass
+
+    # SET NOT NULL сканує таблицю під ACCESS EXCLUSIVE; з перевіреним CHECK (Postgres 12+)
+    # скан пропускається, а VALIDATE іде під легшим блокуванням
+    op.execute("ALTER TABLE reservation ADD CONSTRAINT reservation_time_end_not_null "
+               "CHECK (time_end IS NOT NULL) NOT VALID")
+    op.execute("ALTER TABLE reservation VALIDATE CONSTRAINT reservation_time_end_not_null")
+    op.alter_column('reservation', 'time_end', existing_type=sa.DateTime(), nullable=False)
+    op.drop_constraint('reservation_time_end_not_null', 'reservation', type_='check')
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_reservation_table_time', 'reservation', ['table_id', 'time_start'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_reservation_table_time', table_name='reservation',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('reservation', 'time_end')
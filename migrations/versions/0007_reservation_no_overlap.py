@@ -0,0 +1,49 @@
+"""Заборона подвійного бронювання - reservation.period і GiST exclusion constraint
+
+Revision ID: 0007_reservation_no_overlap
+Revises: 0006_reservation_time_end
+Create Date: 2026-10-18
+
+Броні, що вже перетинаються, не видаляються мовчки - міграція зупиняється і
+показує їх, щоб прибрати вручну і запустити ще раз.
+"""
+from alembic import op, context
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0007_reservation_no_overlap'
+down_revision = '0006_reservation_time_end'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # btree_gist - щоб у GiST exclusion constraint можна було порівнювати table_id через =
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.add_column('reservation', sa.Column('period', postgresql.TSRANGE(), sa.Computed(
+        "tsrange(time_start, time_end, '[)')", persisted=True), nullable=False), if_not_exists=True)
+
+    conn = None if context.is_offline_mode() else op.get_bind()
+    if conn is not None:
+        if conn.scalar(sa.text("SELECT 1 FROM pg_constraint WHERE conname = 'reservation_no_overlap'")):
+            return
+
+        clashes = conn.execute(sa.text("""
+            SELECT a.id AS first, b.id AS second, a.table_id
+            FROM reservation a
+            JOIN reservation b ON b.table_id = a.table_id AND b.id > a.id AND b.period && a.period
+            ORDER BY a.id
+            LIMIT 50
+        """)).all()
+        if clashes:
+            rows = ', '.join(f"#{r.first} і #{r.second} (столик {r.table_id})" for r in clashes)
+            raise RuntimeError(f"Броні перетинаються: {rows}")
+
+    op.create_exclude_constraint('reservation_no_overlap', 'reservation',
+                                 ('table_id', '='), ('period', '&&'), using='gist')
+
+
+def downgrade():
+    op.drop_constraint('reservation_no_overlap', 'reservation', type_='exclude')
+    op.drop_column('reservation', 'period')
@@ -0,0 +1,32 @@
+"""Стан FSM бота в Postgres - fsm_states
+
+Revision ID: 0008_fsm_states
+Revises: 0007_reservation_no_overlap
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0008_fsm_states'
+down_revision = '0007_reservation_no_overlap'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('fsm_states',
+    sa.Column('key', sa.String(length=200), nullable=False),
+    sa.Column('state', sa.String(length=100), nullable=True),
+    sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), server_default=sa.text("'{}'::jsonb"), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_fsm_states_expires_at'), 'fsm_states', ['expires_at'], unique=False,
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_table('fsm_states')
@@ -0,0 +1,26 @@
+"""Маніфест нарізок фото страви - menu.images
+
+Revision ID: 0009_menu_images
+Revises: 0008_fsm_states
+Create Date: 2026-10-18
+
+Нарізки для старих страв робить `python backfill_images.py` (один раз після міграції).
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0009_menu_images'
+down_revision = '0008_fsm_states'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('menu', sa.Column('images', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+                  if_not_exists=True)
+
+
+def downgrade():
+    op.drop_column('menu', 'images')
@@ -0,0 +1,37 @@
+"""Склад замовлень з цінами на момент замовлення - order_items
+
+Revision ID: 0010_order_items
+Revises: 0009_menu_images
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0010_order_items'
+down_revision = '0009_menu_images'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_items',
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('menu_id', sa.Integer(), nullable=False),
+    sa.Column('qty', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['menu_id'], ['menu.id'], ),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('order_id', 'menu_id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_order_items_menu', 'order_items', ['menu_id', 'qty', 'unit_price'], unique=False,
+                    if_not_exists=True)
+    # Нові замовлення пишуть тільки order_items
+    op.alter_column('orders', 'order_list', existing_type=postgresql.JSONB(astext_type=sa.Text()),
+                    nullable=True)
+
+
+def downgrade():
+    op.drop_table('order_items')
@@ -0,0 +1,69 @@
+"""Перенесення старих замовлень з orders.order_list {назва: кількість} в order_items
+
+Revision ID: 0011_backfill_order_items
+Revises: 0010_order_items
+Create Date: 2026-10-18
+
+Ціни тоді не зберігались - беремо поточну ціну страви з такою назвою (менший id).
+Страви, яких вже немає в меню, пропускаються і лишаються тільки в order_list.
+Так само пропускаються нецілі ціна чи кількість ('120 грн', '12.5'): menu.price тут
+ще varchar (integer він стає в 0016), і голий ::integer зупинив би всю міграцію.
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = '0011_backfill_order_items'
+down_revision = '0010_order_items'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+INTEGER_RE = r'^\s*\d+\s*$'
+
+
+BACKFILL_SQL = """
+    INSERT INTO order_items (order_id, menu_id, qty, unit_price)
+    SELECT o.id, m.id, sum(trim(item.value)::integer), trim(m.price)::integer
+    FROM orders o
+    CROSS JOIN LATERAL jsonb_each_text(o.order_list) AS item
+    JOIN LATERAL (
+        SELECT id, price FROM menu WHERE name = item.key ORDER BY id LIMIT 1
+    ) m ON true
+    WHERE o.order_list IS NOT NULL
+      AND item.value ~ '{pattern}' AND m.price ~ '{pattern}'
+      AND NOT EXISTS (SELECT 1 FROM order_items oi WHERE oi.order_id = o.id)
+      {batch}
+    GROUP BY o.id, m.id, m.price
+"""
+
+
+def upgrade():
+    if context.is_offline_mode():
+        # --sql: один INSERT на все, пачками тут нема чим керувати
+        op.execute(BACKFILL_SQL.format(batch='', pattern=INTEGER_RE))
+        return
+
+    conn = op.get_bind()
+    # Кожна пачка комітиться окремо: блокування короткі, а перерваний запуск
+    # продовжиться з місця зупинки - замовлення з рядками вже пропускаються
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            ids = conn.execute(sa.text("""
+                SELECT id FROM orders
+                WHERE id > :last_id AND order_list IS NOT NULL
+                ORDER BY id
+                LIMIT :batch
+            """), {"last_id": last_id, "batch": BATCH_SIZE}).scalars().all()
+            if not ids:
+                break
+
+            conn.execute(sa.text(BACKFILL_SQL.format(batch='AND o.id = ANY(:ids)', pattern=INTEGER_RE)),
+                         {"ids": list(ids)})
+            last_id = ids[-1]
+
+
+def downgrade():
+    # Перенесені рядки не відрізнити від рядків нових замовлень - лишаємо як є
+    pass
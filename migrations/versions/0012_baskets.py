@@ -0,0 +1,31 @@
+"""Серверні кошики - baskets (прострочені прибирає run_mail_worker.py)
+
+Revision ID: 0012_baskets
+Revises: 0011_backfill_order_items
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '0012_baskets'
+down_revision = '0011_backfill_order_items'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('baskets',
+    sa.Column('owner', sa.String(length=64), nullable=False),
+    sa.Column('items', postgresql.JSONB(astext_type=sa.Text()), server_default=sa.text("'{}'::jsonb"), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('owner'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_baskets_expires_at'), 'baskets', ['expires_at'], unique=False,
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_table('baskets')
@@ -0,0 +1,40 @@
+"""Індекси під гарячі запити: замовлення, бронювання, відгуки, chat_id
+
+Revision ID: 0013_hot_indexes
+Revises: 0012_baskets
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0013_hot_indexes'
+down_revision = '0012_baskets'
+branch_labels = None
+depends_on = None
+
+# (назва, таблиця, колонки, WHERE часткового індексу)
+INDEXES = [
+    ('ix_orders_user_time',       'orders',      ['user_id', 'order_time', 'id'],   None),
+    ('ix_orders_active_time',     'orders',      ['order_time', 'id'],              "status <> 'delivered'"),
+    ('ix_reservation_user_time',  'reservation', ['user_id', 'time_start', 'id'],   None),
+    ('ix_reservation_time',       'reservation', ['time_start', 'id'],              None),
+    ('ix_reviews_menu_time',      'reviews',     ['menu_id', 'created_at', 'id'],   None),
+    ('ix_reviews_menu_user',      'reviews',     ['menu_id', 'user_id'],            None),
+    ('ix_users_telegram_chat_id', 'users',       ['telegram_chat_id'],              'telegram_chat_id IS NOT NULL'),
+]
+
+
+def upgrade():
+    # CONCURRENTLY - без блокування записів, але не всередині транзакції
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True,
+                            postgresql_where=sa.text(where) if where else None)
+    op.execute("ANALYZE orders, reservation, reviews, users")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
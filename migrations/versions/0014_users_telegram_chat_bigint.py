@@ -0,0 +1,26 @@
+"""users.telegram_chat_id - BIGINT: id чатів Telegram не вміщаються в integer
+
+Revision ID: 0014_users_telegram_chat_bigint
+Revises: 0013_hot_indexes
+Create Date: 2026-10-18
+
+create_all робив колонку INTEGER, старий README - BIGINT; для BIGINT це no-op без перезапису.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0014_users_telegram_chat_bigint'
+down_revision = '0013_hot_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('users', 'telegram_chat_id', type_=sa.BigInteger(), existing_type=sa.Integer(),
+                    existing_nullable=True)
+
+
+def downgrade():
+    op.alter_column('users', 'telegram_chat_id', type_=sa.Integer(), existing_type=sa.BigInteger(),
+                    existing_nullable=True)
@@ -0,0 +1,26 @@
+"""Унікальний номер столика - seed_tables.py оновлює столики по номеру (upsert)
+
+Revision ID: 0015_tables_number_unique
+Revises: 0014_users_telegram_chat_bigint
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = '0015_tables_number_unique'
+down_revision = '0014_users_telegram_chat_bigint'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY не блокує бронювання, але не працює в транзакції - звідси autocommit_block
+    with op.get_context().autocommit_block():
+        op.create_index('uq_tables_number', 'tables', ['number'], unique=True,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('uq_tables_number', table_name='tables',
+                      postgresql_concurrently=True, if_exists=True)
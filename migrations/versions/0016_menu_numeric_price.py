@@ -0,0 +1,52 @@
+"""Ціна і вага страви - integer замість varchar, індекс (active, price, id)
+
+Revision ID: 0016_menu_numeric_price
+Revises: 0015_tables_number_unique
+Create Date: 2026-10-18
+
+Рядки з нецілими значеннями ('120 грн', '12.5') не приводяться мовчки - міграція
+зупиняється і показує їх, щоб виправити вручну і запустити ще раз.
+"""
+from alembic import op, context
+import sqlalchemy as sa
+
+
+revision = '0016_menu_numeric_price'
+down_revision = '0015_tables_number_unique'
+branch_labels = None
+depends_on = None
+
+INTEGER_RE = r'^\s*\d+\s*$'
+
+
+def upgrade():
+    if not context.is_offline_mode():
+        bad = op.get_bind().execute(sa.text("""
+            SELECT id, price, weight FROM menu
+            WHERE price !~ :pattern OR weight !~ :pattern
+            ORDER BY id
+        """), {"pattern": INTEGER_RE}).all()
+        if bad:
+            rows = ', '.join(f"#{r.id} (price={r.price!r}, weight={r.weight!r})" for r in bad)
+            raise RuntimeError(f"Нецілі ціна/вага у стравах: {rows}")
+
+    # Таблиця меню маленька - перезапис під коротким ACCESS EXCLUSIVE, одна транзакція на обидві колонки
+    op.alter_column('menu', 'price', type_=sa.Integer(), existing_type=sa.String(),
+                    existing_nullable=False, postgresql_using='trim(price)::integer')
+    op.alter_column('menu', 'weight', type_=sa.Integer(), existing_type=sa.String(),
+                    existing_nullable=False, postgresql_using='trim(weight)::integer')
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_menu_active_price', 'menu', ['active', 'price', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_menu_active_price', table_name='menu',
+                      postgresql_concurrently=True, if_exists=True)
+
+    op.alter_column('menu', 'weight', type_=sa.String(), existing_type=sa.Integer(),
+                    existing_nullable=False, postgresql_using='weight::varchar')
+    op.alter_column('menu', 'price', type_=sa.String(), existing_type=sa.Integer(),
+                    existing_nullable=False, postgresql_using='price::varchar')
@@ -0,0 +1,32 @@
+"""Розсилки без повторів: адресати кампанії в broadcast_deliveries, власник кампанії
+
+Revision ID: 0017_broadcast_deliveries
+Revises: 0016_menu_numeric_price
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0017_broadcast_deliveries'
+down_revision = '0016_menu_numeric_price'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('broadcast_campaigns', sa.Column('owner', sa.String(length=32), nullable=True),
+                  if_not_exists=True)
+    op.create_table('broadcast_deliveries',
+    sa.Column('campaign_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.ForeignKeyConstraint(['campaign_id'], ['broadcast_campaigns.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('campaign_id', 'user_id'),
+    if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('broadcast_deliveries')
+    op.drop_column('broadcast_campaigns', 'owner')
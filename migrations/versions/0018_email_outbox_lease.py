@@ -0,0 +1,35 @@
+"""Оренда листів email_outbox: воркер бере пачку як 'sending' і відправляє без транзакції
+
+Revision ID: 0018_email_outbox_lease
+Revises: 0017_broadcast_deliveries
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0018_email_outbox_lease'
+down_revision = '0017_broadcast_deliveries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Листи з простроченою орендою ('sending') воркер теж вибирає - індекс має їх покривати
+    with op.get_context().autocommit_block():
+        op.create_index('ix_email_outbox_due', 'email_outbox', ['next_attempt_at'],
+                        postgresql_where=sa.text("status IN ('pending', 'sending')"),
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_email_outbox_pending', table_name='email_outbox',
+                      postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade():
+    # Стара схема не знає оренди - недовідправлені листи повертаємо в чергу
+    op.execute("UPDATE email_outbox SET status = 'pending' WHERE status = 'sending'")
+    with op.get_context().autocommit_block():
+        op.create_index('ix_email_outbox_pending', 'email_outbox', ['next_attempt_at'],
+                        postgresql_where=sa.text("status = 'pending'"),
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_email_outbox_due', table_name='email_outbox',
+                      postgresql_concurrently=True, if_exists=True)
@@ -2,7 +2,16 @@ import sys, os
 sys.path.insert(0, os.path.dirname(__file__))
 
 import asyncio
-from bot.bot import main
+from dotenv import load_dotenv
+
+load_dotenv()
+# polling - один процес, зручно для розробки; webhook - aiohttp-сервер, кілька воркерів на одному порту
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    if BOT_MODE == 'webhook':
+        from bot.webhook import run_webhook
+        run_webhook()
+    else:
+        from bot.bot import main
+        asyncio.run(main())
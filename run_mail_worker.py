@@ -0,0 +1,14 @@
+import sys, os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import threading
+from shared.mailer import run_worker
+from shared.broadcast import run_campaigns
+from web.basket import run_basket_cleanup
+
+if __name__ == '__main__':
+    # Масові розсилки йдуть окремим потоком, щоб не затримувати листи про замовлення
+    threading.Thread(target=run_campaigns, daemon=True).start()
+    # Прострочені кошики прибираються раз на годину
+    threading.Thread(target=run_basket_cleanup, daemon=True).start()
+    run_worker()
@@ -1,11 +1,8 @@
-from shared.db import Session, Table, Base, engine
+from shared.db import Session, Table
+from sqlalchemy.dialects.postgresql import insert
 
-# Спочатку скидаємо старі таблиці
-Base.metadata.drop_all(engine, tables=[
-    Base.metadata.tables.get('reservation'),
-    Base.metadata.tables.get('tables'),
-])
-Base.metadata.create_all(engine)
+# Схема - з міграцій (alembic upgrade head). Тут тільки дані: столик шукається по номеру
+# і оновлюється на місці, тож повторний запуск безпечний і бронювання не зачіпає.
 
 tables_data = [
     # Тип 1-2 (10 столиків) — вздовж лівої стіни
@@ -35,14 +32,16 @@ tables_data = [
     {"number": 22, "type": "4+",  "label": "VIP-Кут",     "x": 80, "y": 83},
 ]
 
+stmt = insert(Table).values([
+    {"number": t["number"], "type_table": t["type"], "label": t["label"], "x": t["x"], "y": t["y"]}
+    for t in tables_data
+])
+stmt = stmt.on_conflict_do_update(
+    index_elements=[Table.number],
+    set_={column: stmt.excluded[column] for column in ('type_table', 'label', 'x', 'y')},
+)
+
 with Session() as cursor:
-    for t in tables_data:
-        cursor.add(Table(
-            number=t["number"],
-            type_table=t["type"],
-            label=t["label"],
-            x=t["x"],
-            y=t["y"]
-        ))
+    cursor.execute(stmt)
     cursor.commit()
-    print(f"✅ Додано {len(tables_data)} столиків!")
\ No newline at end of file
+    print(f"✅ Оновлено {len(tables_data)} столиків!")
\ No newline at end of file
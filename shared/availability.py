@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, time
+from time import monotonic
+import threading
+
+from sqlalchemy import func
+
+from shared.db import Reservation, Table
+
+
+RESERVATION_DURATIONS = (60, 90, 120, 180)     # хвилини - варіанти у формі бронювання
+DEFAULT_DURATION      = 120
+SLOT_STEP_MINUTES     = 30
+
+# Що бачить юзер, коли exclusion constraint відхилив бронь (див. is_booking_conflict)
+BOOKING_CONFLICT_MESSAGE = 'Цей столик вже заброньований. Оберіть інший.'
+
+# Сітка дня для схеми залу
+HALL_OPEN       = time(10, 0)
+HALL_CLOSE      = time(23, 0)
+HALL_LAYOUT_TTL = 600            # столики майже не змінюються - перечитуємо раз на 10 хв
+TABLE_CAPACITY  = {'1-2': 2, '3-4': 4, '4+': 12}
+
+_layout           = None
+_layout_loaded_at = 0.0
+_layout_lock      = threading.Lock()
+
+
+def parse_duration(raw):
+    """Тривалість з форми; все невідоме - стандартні 2 години."""
+    try:
+        duration = int(raw)
+    except (TypeError, ValueError):
+        return DEFAULT_DURATION
+    return duration if duration in RESERVATION_DURATIONS else DEFAULT_DURATION
+
+
+def parse_slot(time_str, duration_raw):
+    """Проміжок [start, end) з полів форми; None якщо час не розпізнано."""
+    try:
+        start = datetime.strptime(time_str, '%Y-%m-%dT%H:%M')
+    except (TypeError, ValueError):
+        return None
+    return start, start + timedelta(minutes=parse_duration(duration_raw))
+
+
+def next_slot(now=None):
+    """Найближчий початок півгодинного слоту - час за замовчуванням на схемі залу."""
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    extra = -now.minute % SLOT_STEP_MINUTES
+    return now + timedelta(minutes=extra)
+
+
+def overlapping(query, start, end):
+    """
+    Фільтр броней що перетинаються з [start, end): period && tsrange(start, end).
+    Оператор && обслуговує GiST-індекс обмеження reservation_no_overlap (table_id, period),
+    тож запит не перебирає всю історію броней.
+    """
+    return query.filter(Reservation.period.op('&&')(func.tsrange(start, end, '[)')))
+
+
+def busy_table_ids(cursor, start, end, exclude_reservation_id=None):
+    """id столиків, зайнятих хоча б частково у [start, end) - один запит по діапазону."""
+    query = overlapping(cursor.query(Reservation.table_id), start, end)
+    if exclude_reservation_id:
+        query = query.filter(Reservation.id != exclude_reservation_id)
+    return {row.table_id for row in query}
+
+
+def is_booking_conflict(error):
+    """IntegrityError від exclusion constraint reservation_no_overlap (SQLSTATE 23P01)."""
+    return getattr(error.orig, 'pgcode', None) == '23P01'
+
+
+def hall_layout(cursor):
+    """Столики залу з кешу процесу (id, номер, тип, підпис, координати)."""
+    global _layout, _layout_loaded_at
+    with _layout_lock:
+        if _layout is None or monotonic() - _layout_loaded_at > HALL_LAYOUT_TTL:
+            _layout = [
+                {"id": t.id, "number": t.number, "type": t.type_table,
+                 "label": t.label, "x": t.x, "y": t.y}
+                for t in cursor.query(Table).order_by(Table.number).all()
+            ]
+            _layout_loaded_at = monotonic()
+        return _layout
+
+
+def hall_availability(cursor, start, end, exclude_reservation_id=None):
+    """Столики залу у форматі для JS-схеми, з позначкою taken на вибраний проміжок."""
+    busy = busy_table_ids(cursor, start, end, exclude_reservation_id)
+    return [dict(t, taken=t["id"] in busy) for t in hall_layout(cursor)]
+
+
+def day_grid(cursor, day, party=None):
+    """
+    Зайнятість залу на день: для кожного столика бітова маска півгодинних слотів
+    від HALL_OPEN до HALL_CLOSE (біт i = слот i зайнятий), у hex.
+    Один запит по діапазону броней + кешована схема залу.
+    """
+    step     = timedelta(minutes=SLOT_STEP_MINUTES)
+    day_open = datetime.combine(day, HALL_OPEN)
+    day_end  = datetime.combine(day, HALL_CLOSE)
+    slots    = (day_end - day_open) // step
+
+    masks = {}
+    rows  = overlapping(cursor.query(Reservation.table_id, Reservation.time_start, Reservation.time_end),
+                        day_open, day_end)
+    for r in rows:
+        first = max(0, (r.time_start - day_open) // step)
+        last  = min(slots, -((day_open - r.time_end) // step))     # округлення вгору
+        for i in range(first, last):
+            masks[r.table_id] = masks.get(r.table_id, 0) | (1 << i)
+
+    return {
+        "date":         day.isoformat(),
+        "open":         HALL_OPEN.strftime('%H:%M'),
+        "slot_minutes": SLOT_STEP_MINUTES,
+        "slots":        slots,
+        "tables": [
+            dict(t,
+                 fits=party is None or TABLE_CAPACITY.get(t["type"], 0) >= party,
+                 busy=format(masks.get(t["id"], 0), 'x'))
+            for t in hall_layout(cursor)
+        ],
+    }
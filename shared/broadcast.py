@@ -0,0 +1,285 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update, delete, func
+from sqlalchemy.dialects.postgresql import insert
+import threading
+import secrets
+import time
+
+from shared.db import Session, Users, BroadcastCampaign, BroadcastDelivery
+from shared.mailer import SmtpConnection, enqueue_email, is_permanent_error
+from dotenv import load_dotenv
+import os
+
+
+load_dotenv()
+BROADCAST_RATE_PER_SECOND = float(os.getenv('BROADCAST_RATE_PER_SECOND', 10))
+BROADCAST_POOL_SIZE       = int(os.getenv('BROADCAST_POOL_SIZE', 4))
+BROADCAST_BATCH           = 100      # після кожної пачки зберігаємо чекпойнт
+BROADCAST_POLL_SECONDS    = 5
+BROADCAST_STALE_AFTER     = timedelta(minutes=5)   # оренда кампанії: без heartbeat - воркер впав
+BROADCAST_HEARTBEAT       = 30       # секунд; з великим запасом до BROADCAST_STALE_AFTER
+
+
+class CampaignLost(Exception):
+    """Кампанію перехопив інший воркер (наш heartbeat встиг застаріти) - цей зупиняється."""
+
+
+def create_campaign(cursor, subject, body_html):
+    """Ставить розсилку всім юзерам; стартує після commit() caller'а."""
+    cursor.add(BroadcastCampaign(subject=subject, body_html=body_html))
+
+
+class RateLimiter:
+    """Token bucket на всі потоки пулу: не більше rate листів за секунду."""
+
+    def __init__(self, rate):
+        self.rate    = rate
+        self._tokens = rate
+        self._last   = time.monotonic()
+        self._lock   = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ConnectionPool:
+    """Кілька постійних SMTP-з'єднань; кожен потік бере своє і повертає після відправки."""
+
+    def __init__(self, size):
+        self._free = [SmtpConnection() for _ in range(size)]
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            return self._free.pop()
+
+    def release(self, connection):
+        with self._lock:
+            self._free.append(connection)
+
+    def close(self):
+        for connection in self._free:
+            connection.close()
+
+
+def claim_campaign():
+    """
+    Бере нову кампанію або ту, що зависла в 'running' (воркер впав посеред розсилки).
+    Повертає (id, subject, body_html, last_user_id, owner) або None;
+    owner - токен, з яким цей воркер далі пише чекпойнти.
+    """
+    stale = datetime.utcnow() - BROADCAST_STALE_AFTER
+    with Session() as cursor:
+        campaign = cursor.query(BroadcastCampaign)\
+            .filter(
+                (BroadcastCampaign.status == 'pending') |
+                ((BroadcastCampaign.status == 'running') & (BroadcastCampaign.heartbeat_at < stale))
+            )\
+            .order_by(BroadcastCampaign.id)\
+            .with_for_update(skip_locked=True)\
+            .first()
+
+        if not campaign:
+            return None
+
+        if campaign.status == 'running':
+            # Оренда попереднього воркера минула: його 'sending' - записані, але без результату.
+            # Лист міг піти, тож повторно не шлемо, а позначаємо і звітуємо
+            unknown = cursor.execute(
+                update(BroadcastDelivery)
+                .where(BroadcastDelivery.campaign_id == campaign.id, BroadcastDelivery.status == 'sending')
+                .values(status='unknown')
+            ).rowcount
+            if unknown:
+                print(f"[BROADCAST] #{campaign.id}: {unknown} адресатів з невідомим результатом")
+
+        campaign.status       = 'running'
+        campaign.owner        = secrets.token_hex(16)
+        campaign.heartbeat_at = datetime.utcnow()
+        cursor.commit()
+        return campaign.id, campaign.subject, campaign.body_html, campaign.last_user_id, campaign.owner
+
+
+def checkpoint(cursor, campaign_id, owner, **values):
+    """
+    Оновлює heartbeat (і передані поля) тільки поки кампанія наша.
+    Якщо її вже перехопив інший воркер - CampaignLost, нічого не пишемо.
+    """
+    result = cursor.execute(
+        update(BroadcastCampaign)
+        .where(BroadcastCampaign.id == campaign_id, BroadcastCampaign.owner == owner)
+        .values(heartbeat_at=datetime.utcnow(), **values)
+    )
+    if result.rowcount != 1:
+        raise CampaignLost(campaign_id)
+
+
+def keep_alive(campaign_id, owner, stop, lost):
+    """Heartbeat окремим потоком - повільний SMTP посеред пачки не робить кампанію «завислою»."""
+    while not stop.wait(BROADCAST_HEARTBEAT):
+        try:
+            with Session() as cursor:
+                checkpoint(cursor, campaign_id, owner)
+                cursor.commit()
+        except CampaignLost:
+            lost.set()
+            return
+        except Exception as e:
+            print(f"[BROADCAST HEARTBEAT ERROR] {e}")
+
+
+def recipients_page(after_user_id):
+    """Наступні BROADCAST_BATCH юзерів після чекпойнта - keyset по id, коротка транзакція на сторінку."""
+    with Session() as cursor:
+        return cursor.query(Users.id, Users.email)\
+            .filter(Users.id > after_user_id)\
+            .order_by(Users.id)\
+            .limit(BROADCAST_BATCH)\
+            .all()
+
+
+def claim_recipients(campaign_id, user_ids):
+    """
+    Записує адресатів пачки до відправки одним INSERT.
+    Повертає id тих, кого записали ми; решті лист уже йшов (до падіння або з іншого воркера).
+    """
+    with Session() as cursor:
+        claimed = cursor.execute(
+            insert(BroadcastDelivery)
+            .values([{'campaign_id': campaign_id, 'user_id': user_id} for user_id in user_ids])
+            .on_conflict_do_nothing()
+            .returning(BroadcastDelivery.user_id)
+        ).scalars().all()
+        cursor.commit()
+    return set(claimed)
+
+
+def finish_batch(campaign, owner, results, skipped, last_user_id):
+    """
+    Результати пачки, повтори і чекпойнт - однією транзакцією.
+    Результати пишуться навіть якщо кампанію вже перехопили (CampaignLost після commit):
+    це факти про відправлені листи, а 'unknown' від нового воркера вони уточнюють.
+    """
+    campaign_id, subject, body_html = campaign
+    sent   = [row.id for row, error in results if error is None]
+    failed = [row.id for row, error in results if error is not None]
+    ours   = (BroadcastDelivery.campaign_id == campaign_id,
+              BroadcastDelivery.status.in_(('sending', 'unknown')))
+
+    with Session() as cursor:
+        for status, user_ids in (('sent', sent), ('failed', failed)):
+            if user_ids:
+                cursor.execute(
+                    update(BroadcastDelivery)
+                    .where(*ours, BroadcastDelivery.user_id.in_(user_ids))
+                    .values(status=status)
+                )
+        if skipped:
+            # Записали, але не відправляли (кампанію перехопили) - звільняємо для нового власника
+            cursor.execute(delete(BroadcastDelivery).where(*ours, BroadcastDelivery.user_id.in_(skipped)))
+        for row, error in results:
+            # Лист, який ще може пройти, йде у звичайну чергу з повторами
+            if error is not None and not is_permanent_error(error):
+                enqueue_email(cursor, row.email, subject, body_html)
+        try:
+            # Чекпойнт пачки - щоб після перезапуску не перебирати вже оброблених юзерів.
+            # Від повторів захищає broadcast_deliveries, тут лише прогрес.
+            checkpoint(cursor, campaign_id, owner,
+                       last_user_id=last_user_id,
+                       sent_count=BroadcastCampaign.sent_count + len(sent),
+                       failed_count=BroadcastCampaign.failed_count + len(failed))
+        finally:
+            cursor.commit()
+    return len(sent), len(failed)
+
+
+def send_batch(campaign, owner, batch, pool, limiter, executor, lost):
+    """
+    Відправляє пачку паралельно через пул.
+    Адресати пачки спершу записуються в broadcast_deliveries - хто вже там, пропускається.
+    Повертає (надіслано, не пройшло).
+    """
+    campaign_id, subject, body_html = campaign
+    claimed = claim_recipients(campaign_id, [row.id for row in batch])
+
+    def send_one(row):
+        limiter.acquire()
+        if lost.is_set():
+            return row, CampaignLost(campaign_id)
+        connection = pool.acquire()
+        try:
+            # Лист збирається під кожного адресата: To: проходить перевірку EmailMessage
+            connection.send(row.email, subject, body_html)
+            return row, None
+        except Exception as e:
+            print(f"[BROADCAST] {row.email}: {e}")
+            connection.close()
+            return row, e
+        finally:
+            pool.release(connection)
+
+    results = list(executor.map(send_one, [row for row in batch if row.id in claimed]))
+    skipped = [row.id for row, error in results if isinstance(error, CampaignLost)]
+    results = [(row, error) for row, error in results if not isinstance(error, CampaignLost)]
+    return finish_batch(campaign, owner, results, skipped, batch[-1].id)
+
+
+def run_campaign(campaign_id, subject, body_html, last_user_id, owner):
+    # HTML листа рендериться один раз при створенні кампанії; тут лише SMTP
+    pool     = ConnectionPool(BROADCAST_POOL_SIZE)
+    limiter  = RateLimiter(BROADCAST_RATE_PER_SECOND)
+    stop, lost = threading.Event(), threading.Event()
+    threading.Thread(target=keep_alive, args=(campaign_id, owner, stop, lost), daemon=True).start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=BROADCAST_POOL_SIZE) as executor:
+            while batch := recipients_page(last_user_id):
+                send_batch((campaign_id, subject, body_html), owner, batch, pool, limiter, executor, lost)
+                last_user_id = batch[-1].id
+    finally:
+        stop.set()
+        pool.close()
+
+    with Session() as cursor:
+        # Лічильники - точно з адресатів, а не сумою пачок (після падіння пачка могла не дописатись)
+        counts = dict(cursor.query(BroadcastDelivery.status, func.count())
+                      .filter(BroadcastDelivery.campaign_id == campaign_id)
+                      .group_by(BroadcastDelivery.status)
+                      .all())
+        checkpoint(cursor, campaign_id, owner,
+                   status='done',
+                   finished_at=datetime.utcnow(),
+                   sent_count=counts.get('sent', 0),
+                   failed_count=counts.get('failed', 0))
+        cursor.commit()
+    print(f"📣 Розсилку #{campaign_id} завершено: {counts.get('sent', 0)} надіслано, "
+          f"{counts.get('failed', 0)} не пройшло")
+    if counts.get('unknown'):
+        # Воркер впав між записом адресатів і результатом - повторно не шлемо, щоб не задублювати
+        print(f"[BROADCAST] #{campaign_id}: {counts['unknown']} адресатів з невідомим результатом")
+
+
+def run_campaigns(poll_seconds=BROADCAST_POLL_SECONDS):
+    """Нескінченний цикл розсилок - запускається окремим потоком з run_mail_worker.py."""
+    while True:
+        try:
+            claimed = claim_campaign()
+            if claimed:
+                run_campaign(*claimed)
+                continue
+        except CampaignLost as e:
+            print(f"[BROADCAST] розсилку #{e} веде інший воркер - цей її залишає")
+            continue
+        except Exception as e:
+            print(f"[BROADCAST ERROR] {e}")
+        time.sleep(poll_seconds)
@@ -0,0 +1,133 @@
+from PIL import Image, ImageOps
+from io import BytesIO
+from urllib.parse import quote
+import hashlib
+import os
+
+
+ROOT_DIR            = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MENU_IMAGES_DIR     = os.path.join(ROOT_DIR, 'web', 'static', 'menu')
+MENU_IMAGES_URL     = '/static/menu/'
+# Оригінали не роздаються як статика - тільки для повторної нарізки
+MENU_ORIGINALS_DIR  = os.path.join(ROOT_DIR, 'media', 'originals')
+
+ALLOWED_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+MAX_PIXELS      = 40_000_000            # захист від "декомпресійної бомби"
+IMAGE_WIDTHS    = (320, 640, 960, 1280)
+DEFAULT_WIDTH   = 960                   # src для браузерів без srcset
+IMAGE_FORMATS   = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _write_once(folder, name, data):
+    """Файл з іменем-хешем або вже є з тим самим вмістом, або пишеться атомарно."""
+    path = os.path.join(folder, name)
+    if not os.path.exists(path):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return name
+
+
+def _open_valid(data):
+    try:
+        with Image.open(BytesIO(data)) as probe:
+            # Розмір відомий із заголовка, до декодування. Pillow сам кидає DecompressionBombError
+            # лише з 2 x MAX_IMAGE_PIXELS, а між 1x і 2x тільки попереджає - перевіряємо явно
+            if probe.width * probe.height > MAX_PIXELS:
+                raise InvalidImage("Зображення завелике.")
+            probe.verify()                  # ловить обрізані/биті файли
+        image = Image.open(BytesIO(data))
+        image.load()
+    except Image.DecompressionBombError:
+        raise InvalidImage("Зображення завелике.")
+    except (OSError, SyntaxError):
+        raise InvalidImage("Файл не є зображенням або пошкоджений.")
+
+    if image.format not in ALLOWED_FORMATS:
+        raise InvalidImage(f"Непідтримуваний формат {image.format}, дозволено JPEG, PNG, WebP.")
+    return image
+
+
+def _flatten(image):
+    """EXIF-поворот + RGB на білому тлі. Нове зображення не несе EXIF/GPS/ICC оригіналу."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def ingest_image(path):
+    """
+    Обробляє завантажене фото страви:
+    перевіряє, кладе оригінал у MENU_ORIGINALS_DIR, ріже ширини IMAGE_WIDTHS
+    у WebP і JPEG без метаданих. Кожен файл називається хешем свого вмісту,
+    тож його можна кешувати назавжди. CPU-важка - в боті запускається в пулі процесів.
+
+    Повертає маніфест для Menu.images:
+    {'original': ..., 'width': ..., 'height': ..., 'webp': [[320, ім'я], ...], 'jpeg': [...]}
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    source = _open_valid(data)
+    os.makedirs(MENU_ORIGINALS_DIR, exist_ok=True)
+    os.makedirs(MENU_IMAGES_DIR, exist_ok=True)
+
+    original = hashlib.sha256(data).hexdigest()[:32] + ALLOWED_FORMATS[source.format]
+    _write_once(MENU_ORIGINALS_DIR, original, data)
+
+    image  = _flatten(source)
+    widths = sorted({min(width, image.width) for width in IMAGE_WIDTHS})
+    manifest = {'original': original, 'width': image.width, 'height': image.height,
+                'webp': [], 'jpeg': []}
+
+    for width in widths:
+        height  = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for key, (fmt, options) in IMAGE_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, fmt, **options)
+            body = buffer.getvalue()
+            name = hashlib.sha256(body).hexdigest()[:20] + ('.webp' if key == 'webp' else '.jpg')
+            manifest[key].append([width, _write_once(MENU_IMAGES_DIR, name, body)])
+    return manifest
+
+
+def default_file(images):
+    """JPEG ширини до DEFAULT_WIDTH - йде в Menu.file_name як звичайний src."""
+    fitting = [name for width, name in images['jpeg'] if width <= DEFAULT_WIDTH]
+    return fitting[-1] if fitting else images['jpeg'][0][1]
+
+
+def smallest_file(images, key='jpeg'):
+    return images[key][0][1]
+
+
+def srcset(images, key):
+    return ', '.join(f"{MENU_IMAGES_URL}{name} {width}w" for width, name in images[key])
+
+
+def menu_picture(file_name, images):
+    """
+    Все що потрібно для <picture>: src + srcset WebP/JPEG.
+    Старі страви без маніфесту - тільки src оригіналу.
+    """
+    if not file_name:
+        return None
+    src = MENU_IMAGES_URL + quote(file_name)
+    if not images:
+        return {'src': src, 'webp': None, 'jpeg': None}
+    return {'src': src, 'webp': srcset(images, 'webp'), 'jpeg': srcset(images, 'jpeg')}
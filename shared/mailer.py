@@ -0,0 +1,203 @@
+from email.message import EmailMessage
+from email.utils import formataddr
+from email import policy
+from datetime import datetime, timedelta
+import smtplib
+import time
+
+from shared.db import Session, EmailOutbox
+from dotenv import load_dotenv
+import os
+
+
+load_dotenv()
+MAIL_SERVER   = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+MAIL_PORT     = int(os.getenv('MAIL_PORT', 587))
+MAIL_USE_TLS  = os.getenv('MAIL_USE_TLS', '1') == '1'
+MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+MAIL_SENDER   = formataddr(('Останній Прихисток', MAIL_USERNAME or 'noreply@localhost'))
+
+OUTBOX_BATCH        = 50
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_POLL_SECONDS = 2
+OUTBOX_LEASE        = timedelta(minutes=10)   # пачку, що не встигла, воркер обриває і віддає залишок
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS  = 3600
+
+
+def enqueue_email(cursor, to, subject, body_html):
+    """Кладе лист у чергу в межах сесії caller'а - відправиться після його commit()."""
+    cursor.add(EmailOutbox(recipient=to, subject=subject, body_html=body_html))
+
+
+def backoff_delay(attempts):
+    """30с, 1хв, 2хв, 4хв ... але не більше години."""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def is_permanent_error(error):
+    """5xx від сервера, відхилений або зіпсований адресат - повтор не допоможе."""
+    # ValueError - адреса з переносом рядка: EmailMessage не пускає її в заголовок
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, ValueError)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def build_message(subject, body_html, to=None, sender=MAIL_SENDER):
+    """policy.SMTP - рядки через CRLF, як того вимагає SMTP; CR/LF у заголовках дає ValueError."""
+    msg = EmailMessage(policy=policy.SMTP)
+    msg['From']    = sender
+    if to:
+        msg['To']  = to
+    msg['Subject'] = subject
+    msg.set_content(body_html, subtype='html')
+    return msg
+
+
+class SmtpConnection:
+    """Одне постійне SMTP-з'єднання на весь воркер, з перепідключенням при обриві."""
+
+    def __init__(self, host=MAIL_SERVER, port=MAIL_PORT, use_tls=MAIL_USE_TLS,
+                 username=MAIL_USERNAME, password=MAIL_PASSWORD, sender=MAIL_SENDER):
+        self.host     = host
+        self.port     = port
+        self.use_tls  = use_tls
+        self.username = username
+        self.password = password
+        self.sender   = sender
+        self._smtp    = None
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+
+    def send(self, to, subject, body_html):
+        raw_message = build_message(subject, body_html, to=to, sender=self.sender).as_bytes()
+        if self._smtp is None:
+            self._connect()
+
+        try:
+            self._smtp.sendmail(self.sender, [to], raw_message)
+        except smtplib.SMTPServerDisconnected:
+            # Сервер закрив бездіяльне з'єднання - пробуємо ще раз з новим
+            self._connect()
+            self._smtp.sendmail(self.sender, [to], raw_message)
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+
+def claim_outbox(batch_size):
+    """
+    Бере пачку листів в оренду: status='sending', next_attempt_at - кінець оренди.
+    Блокування живуть тільки до commit() - SMTP іде вже без транзакції.
+    Лист, чия оренда минула (воркер впав посеред пачки), береться знову.
+    Повертає (кінець оренди, [(id, recipient, subject, body_html), ...]).
+    """
+    now   = datetime.utcnow()
+    lease = now + OUTBOX_LEASE
+    with Session() as cursor:
+        batch = cursor.query(EmailOutbox)\
+            .filter(EmailOutbox.status.in_(('pending', 'sending')), EmailOutbox.next_attempt_at <= now)\
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)\
+            .limit(batch_size)\
+            .with_for_update(skip_locked=True)\
+            .all()
+
+        claimed = []
+        for mail in batch:
+            mail.status          = 'sending'
+            mail.next_attempt_at = lease
+            claimed.append((mail.id, mail.recipient, mail.subject, mail.body_html))
+        cursor.commit()
+    return lease, claimed
+
+
+def leased(cursor, mail_ids, lease):
+    """Листи, які досі в нашій оренді: кінець оренди - той самий, що ми записали."""
+    return cursor.query(EmailOutbox)\
+        .filter(EmailOutbox.id.in_(mail_ids),
+                EmailOutbox.status == 'sending',
+                EmailOutbox.next_attempt_at == lease)
+
+
+def finish_mail(mail_id, lease, error=None):
+    """Результат одного листа - власною короткою транзакцією."""
+    with Session() as cursor:
+        mail = leased(cursor, [mail_id], lease).first()
+        if mail is None:
+            # Оренда минула і лист узяв інший воркер - його результат важливіший
+            return
+        if error is None:
+            mail.status  = 'sent'
+            mail.sent_at = datetime.utcnow()
+        else:
+            mail.attempts  += 1
+            mail.last_error = str(error)[:500]
+            if is_permanent_error(error) or mail.attempts >= OUTBOX_MAX_ATTEMPTS:
+                mail.status = 'dead'
+                print(f"[MAIL DEAD] #{mail.id} {mail.recipient}: {error}")
+            else:
+                mail.status          = 'pending'
+                mail.next_attempt_at = datetime.utcnow() + backoff_delay(mail.attempts)
+                print(f"[MAIL RETRY] #{mail.id} спроба {mail.attempts}: {error}")
+        cursor.commit()
+
+
+def release_outbox(mail_ids, lease):
+    """Повертає невідправлений залишок пачки в чергу одразу, не чекаючи кінця оренди."""
+    with Session() as cursor:
+        leased(cursor, mail_ids, lease)\
+            .update({'status': 'pending', 'next_attempt_at': datetime.utcnow()}, synchronize_session=False)
+        cursor.commit()
+
+
+def drain_outbox(connection, batch_size=OUTBOX_BATCH):
+    """
+    Відправляє одну пачку листів з черги. Повертає кількість оброблених.
+    SKIP LOCKED і оренда дозволяють запускати кілька воркерів без подвійних відправок.
+    """
+    lease, batch = claim_outbox(batch_size)
+
+    processed = 0
+    for mail_id, recipient, subject, body_html in batch:
+        if datetime.utcnow() >= lease:
+            # Оренда скінчилась - решту пачки вже може взяти інший воркер
+            break
+        processed += 1
+        try:
+            connection.send(recipient, subject, body_html)
+        except (smtplib.SMTPException, OSError, ValueError) as e:
+            finish_mail(mail_id, lease, e)
+            if not is_permanent_error(e):
+                # З'єднання могло зламатись - решту пачки залишаємо на наступний прохід
+                connection.close()
+                break
+        else:
+            finish_mail(mail_id, lease)
+
+    if processed < len(batch):
+        release_outbox([mail_id for mail_id, *_ in batch[processed:]], lease)
+    return processed
+
+
+def run_worker(poll_seconds=OUTBOX_POLL_SECONDS):
+    connection = SmtpConnection()
+    print(f"✉ Поштовий воркер запущено ({MAIL_SERVER}:{MAIL_PORT})...")
+    try:
+        while True:
+            # Поки є повні пачки - не спимо
+            if drain_outbox(connection) < OUTBOX_BATCH:
+                time.sleep(poll_seconds)
+    finally:
+        connection.close()
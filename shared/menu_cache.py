@@ -0,0 +1,121 @@
+from collections import namedtuple
+from time import monotonic, sleep
+import threading
+import select
+import os
+
+from shared.db import Session, Menu, engine, MENU_CHANNEL
+
+
+# Легкий знімок позиції меню - все що потрібно для підрахунку кошика
+MenuItem = namedtuple('MenuItem', ['id', 'name', 'price', 'active'])
+
+MENU_PING    = 60       # як часто перевіряти, що LISTEN-з'єднання живе
+MENU_BACKOFF = 60       # найдовша пауза між спробами перепідключитись
+
+
+class MenuCatalogue:
+    """
+    Кеш меню в пам'яті процесу: id -> (name, price, active).
+
+    Промахи добираються одним запитом WHERE ... IN (...), тож кошик з 10 страв
+    коштує максимум один запит замість десяти. Після змін у меню викликаємо
+    invalidate() - кеш очищується, а version зростає (від неї залежать ключі
+    fragment_cache). Зміни з інших процесів (бот, інші воркери сайту) приходять
+    через NOTIFY у потік listen(); TTL - страховка, якщо NOTIFY загубився.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl           = ttl
+        self.version       = 0
+        self._lock         = threading.Lock()
+        self._by_id        = {}
+        self._loaded_at    = monotonic()
+        self._listener_pid = None
+
+    def invalidate(self):
+        with self._lock:
+            # Новий словник, а не clear(): get_many() дочитує свій знімок без змін
+            self._by_id     = {}
+            self._loaded_at = monotonic()
+            self.version   += 1
+
+    def _expire_if_stale(self):
+        if monotonic() - self._loaded_at > self.ttl:
+            self.invalidate()
+
+    def _fetch(self, condition, version):
+        with Session() as cursor:
+            rows = cursor.query(Menu.id, Menu.name, Menu.price, Menu.active)\
+                .filter(condition)\
+                .order_by(Menu.id)\
+                .all()
+        items = {row.id: MenuItem(row.id, row.name, row.price, bool(row.active)) for row in rows}
+        with self._lock:
+            # Поки йшов запит, меню могли змінити - тоді прочитане в новий кеш не кладемо
+            if self.version == version:
+                self._by_id.update(items)
+        return items
+
+    def get_many(self, ids):
+        """Повертає {id: MenuItem} для всіх знайдених id."""
+        self._expire_if_stale()
+        with self._lock:
+            known, version = self._by_id, self.version
+        ids     = set(ids)
+        found   = {i: known[i] for i in ids if i in known}
+        missing = ids - found.keys()
+        if missing:
+            found.update(self._fetch(Menu.id.in_(missing), version))
+        return found
+
+    def get(self, menu_id):
+        return self.get_many([menu_id]).get(menu_id)
+
+    def listen(self):
+        """
+        Запускає фоновий потік LISTEN у поточному процесі (повторний виклик нічого не робить).
+        Викликати з процесу, що обслуговує запити: потік не переживає fork воркера.
+        """
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen_loop, name='menu-listen', daemon=True).start()
+
+    def _listen_loop(self):
+        # Ті самі параметри, що й у пулу engine, але окреме з'єднання - воно зайняте LISTEN назавжди
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        delay = 1
+        while True:
+            connection = None
+            try:
+                # keepalives - напіввідкрите з'єднання рве ядро, а не висить вічно
+                connection = engine.dialect.connect(*cargs, **cparams, keepalives=1, keepalives_idle=30,
+                                                    keepalives_interval=10, keepalives_count=3)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {MENU_CHANNEL}")
+                # NOTIFY, що прийшли без з'єднання, загубились - кешу більше не віримо
+                self.invalidate()
+                delay = 1
+
+                while True:
+                    if not select.select([connection], [], [], MENU_PING)[0]:
+                        with connection.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                    connection.poll()
+                    if connection.notifies:
+                        connection.notifies.clear()
+                        self.invalidate()
+            except Exception as e:
+                print(f"[MENU CACHE] LISTEN: {e!r}, перепідключення через {delay} с")
+            finally:
+                if connection:
+                    connection.close()
+
+            sleep(delay)
+            delay = min(delay * 2, MENU_BACKOFF)
+
+
+menu_catalogue = MenuCatalogue()
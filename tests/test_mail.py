@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+from functools import partial
+import socket
+
+import pytest
+
+import shared.db
+import shared.broadcast
+from shared.db import Users, BroadcastCampaign, BroadcastDelivery, EmailOutbox
+from shared.mailer import SmtpConnection, drain_outbox, enqueue_email
+from shared.broadcast import claim_campaign, run_campaign
+
+controller = pytest.importorskip('aiosmtpd.controller')
+
+
+class Inbox:
+    """Обробник aiosmtpd: складає отримані листи у список."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+    def to(self, email):
+        return [m for m in self.messages if email in m.rcpt_tos]
+
+
+@pytest.fixture
+def smtp_sink(db, monkeypatch):
+    """Локальний SMTP (aiosmtpd) замість Gmail; Session пише в тестову БД."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    inbox = Inbox()
+    sink  = controller.Controller(inbox, hostname='127.0.0.1', port=port)
+    sink.start()
+    connection = partial(SmtpConnection, host='127.0.0.1', port=port, use_tls=False, username=None)
+    monkeypatch.setitem(shared.db.Session.kw, 'bind', db.kw['bind'])
+    monkeypatch.setattr(shared.broadcast, 'SmtpConnection', connection)
+    monkeypatch.setattr(shared.broadcast, 'BROADCAST_RATE_PER_SECOND', 1000)
+    monkeypatch.setattr(shared.broadcast, 'BROADCAST_BATCH', 3)
+    yield inbox, connection
+    sink.stop()
+
+
+def seed_users(db, emails):
+    with db() as cursor:
+        users = [Users(nickname=f'user{i}', password='-', email=email) for i, email in enumerate(emails)]
+        cursor.add_all(users)
+        cursor.add(BroadcastCampaign(subject='Нові страви', body_html='<b>Борщ</b>'))
+        cursor.commit()
+        return [u.id for u in users]
+
+
+def test_broadcast_sends_each_user_one_crlf_message(db, smtp_sink):
+    inbox, _ = smtp_sink
+    emails = [f'guest{i}@example.com' for i in range(7)] + ['bad@example.com\r\nBcc: spy@example.com']
+    seed_users(db, emails)
+
+    run_campaign(*claim_campaign())
+
+    for email in emails[:-1]:
+        [message] = inbox.to(email)
+        assert b'\r\n' in message.original_content
+        assert b'\n' not in message.original_content.replace(b'\r\n', b'')
+    # Адреса з переносом рядка не стає заголовком і не йде в повтори
+    assert not any('spy@example.com' in m.rcpt_tos or b'spy@' in m.original_content for m in inbox.messages)
+    with db() as cursor:
+        campaign = cursor.query(BroadcastCampaign).one()
+        assert (campaign.status, campaign.sent_count, campaign.failed_count) == ('done', 7, 1)
+        assert cursor.query(EmailOutbox).count() == 0
+
+
+def test_takeover_reports_unfinished_recipients_instead_of_resending(db, smtp_sink):
+    inbox, _ = smtp_sink
+    user_ids = seed_users(db, [f'guest{i}@example.com' for i in range(5)])
+    with db() as cursor:
+        # Попередній воркер записав адресатів першої пачки і впав до результату
+        campaign = cursor.query(BroadcastCampaign).one()
+        campaign.status, campaign.owner = 'running', 'dead-worker'
+        campaign.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+        cursor.add_all([BroadcastDelivery(campaign_id=campaign.id, user_id=i) for i in user_ids[:3]])
+        cursor.commit()
+
+    run_campaign(*claim_campaign())
+
+    assert sorted(m.rcpt_tos[0] for m in inbox.messages) == ['guest3@example.com', 'guest4@example.com']
+    with db() as cursor:
+        statuses = dict(cursor.query(BroadcastDelivery.user_id, BroadcastDelivery.status).all())
+    assert [statuses[i] for i in user_ids] == ['unknown'] * 3 + ['sent'] * 2
+
+
+def test_outbox_delivers_queue_and_drops_broken_address(db, smtp_sink):
+    inbox, connection = smtp_sink
+    with db() as cursor:
+        for i in range(3):
+            enqueue_email(cursor, f'guest{i}@example.com', 'Замовлення', '<b>Прийнято</b>')
+        enqueue_email(cursor, 'bad@example.com\r\nBcc: spy@example.com', 'Замовлення', '-')
+        cursor.commit()
+
+    smtp = connection()
+    try:
+        assert drain_outbox(smtp) == 4
+        assert drain_outbox(smtp) == 0
+    finally:
+        smtp.close()
+
+    assert sorted(m.rcpt_tos[0] for m in inbox.messages) == [f'guest{i}@example.com' for i in range(3)]
+    with db() as cursor:
+        statuses = sorted(status for status, in cursor.query(EmailOutbox.status))
+    assert statuses == ['dead', 'sent', 'sent', 'sent']
+
+
+def test_outbox_reclaims_mail_after_lease_expires(db, smtp_sink):
+    inbox, connection = smtp_sink
+    with db() as cursor:
+        # Воркер узяв лист в оренду і впав: оренда вже минула, а інший лист ще орендований
+        cursor.add_all([
+            EmailOutbox(recipient='lost@example.com', subject='-', body_html='-', status='sending',
+                        next_attempt_at=datetime.utcnow() - timedelta(minutes=1)),
+            EmailOutbox(recipient='busy@example.com', subject='-', body_html='-', status='sending',
+                        next_attempt_at=datetime.utcnow() + timedelta(minutes=5)),
+        ])
+        cursor.commit()
+
+    smtp = connection()
+    try:
+        assert drain_outbox(smtp) == 1
+    finally:
+        smtp.close()
+
+    assert [m.rcpt_tos for m in inbox.messages] == [['lost@example.com']]
@@ -0,0 +1,289 @@
+from contextlib import contextmanager
+import asyncio
+import json
+import re
+
+import pytest
+from sqlalchemy import event, text, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+import shared.db
+import shared.menu_cache
+from shared.db import Base, TelegramCode
+from shared.menu_cache import menu_catalogue
+from web.app import app
+import bot.identity
+from bot.identity import IdentityCache
+from bot.handlers.admin import orders_pager
+
+
+# Обсяги, на яких seq scan вже програє індексу - як у робочій базі за рік-два
+USERS        = 5000
+ORDERS       = 100000
+RESERVATIONS = 40000
+REVIEWS      = 60000
+DISHES       = 50
+TABLES       = 20
+BASKETS      = 50000
+
+USER_ID     = 42
+ADMIN_ID    = USERS + 1
+MENU_ID     = 7
+LINKED_CHAT = 100000000000 + USER_ID
+BUSY_DAY    = '2024-03-01'
+
+SEED_SQL = [
+    f"""INSERT INTO users (nickname, password, email, telegram_chat_id)
+        SELECT 'u' || g, '-', 'u' || g || '@example.com',
+               CASE WHEN g % 2 = 0 THEN 100000000000 + g END
+        FROM generate_series(1, {USERS}) g""",
+    "INSERT INTO users (nickname, password, email) VALUES ('Admin', '-', 'admin@example.com')",
+    f"""INSERT INTO menu (name, weight, ingredients, description, price, active, file_name)
+        SELECT 'Страва ' || g, 300, 'інгредієнти', 'опис', 100 + g, true, ''
+        FROM generate_series(1, {DISHES}) g""",
+    f"""INSERT INTO tables (number, type_table, label, x, y)
+        SELECT g, '1-2', 'Столик', g, g FROM generate_series(1, {TABLES}) g""",
+    # 2% замовлень ще не доставлені - саме їх гортає адмін у боті
+    f"""INSERT INTO orders (order_time, user_id, status)
+        SELECT timestamp '2026-01-01' - g * interval '5 minutes', 1 + g % {USERS},
+               CASE WHEN g % 50 = 0 THEN 'new' ELSE 'delivered' END
+        FROM generate_series(1, {ORDERS}) g""",
+    # Броні одного столика йдуть одна за одною без перетинів
+    f"""INSERT INTO reservation (time_start, time_end, user_id, table_id)
+        SELECT timestamp '2024-01-01' + (g / {TABLES}) * interval '3 hours',
+               timestamp '2024-01-01' + (g / {TABLES}) * interval '3 hours' + interval '2 hours',
+               1 + g % {USERS}, 1 + g % {TABLES}
+        FROM generate_series(0, {RESERVATIONS - 1}) g""",
+    f"""INSERT INTO reviews (user_id, menu_id, rating, comment, created_at)
+        SELECT 1 + g % {USERS}, 1 + g % {DISHES}, 1 + g % 5, 'Смачно',
+               timestamp '2026-01-01' - g * interval '7 minutes'
+        FROM generate_series(1, {REVIEWS}) g""",
+    # Постійний гість - у нього списки на кілька сторінок
+    f"""INSERT INTO orders (order_time, user_id, status)
+        SELECT timestamp '2026-02-01' - g * interval '1 day', {USER_ID}, 'delivered'
+        FROM generate_series(1, 60) g""",
+    f"""INSERT INTO reservation (time_start, time_end, user_id, table_id)
+        SELECT timestamp '2025-06-01' + g * interval '3 hours',
+               timestamp '2025-06-01' + g * interval '3 hours' + interval '2 hours', {USER_ID}, 1
+        FROM generate_series(1, 60) g""",
+    # Дві страви в кожному замовленні
+    f"""INSERT INTO order_items (order_id, menu_id, qty, unit_price)
+        SELECT o.id, 1 + (o.id + k) % {DISHES}, 1 + k, 100
+        FROM orders o, generate_series(0, 1) k""",
+    # Кошики гостей, які так і не оформили замовлення
+    f"""INSERT INTO baskets (owner, items, expires_at)
+        SELECT 'anon:' || g, '{{"1": 1}}', timestamp '2100-01-01'
+        FROM generate_series(1, {BASKETS}) g""",
+    f"""INSERT INTO telegram_codes (user_id, code, created_at)
+        SELECT g, lpad(g::text, 8, '0'), timestamp '2026-01-01'
+        FROM generate_series(1, {USERS // 2}) g""",
+    "ANALYZE",
+]
+
+
+@pytest.fixture(scope='module')
+def seeded(engine):
+    with engine.begin() as conn:
+        for sql in SEED_SQL:
+            conn.execute(text(sql))
+    yield
+    tables = ', '.join(table.name for table in Base.metadata.sorted_tables)
+    with engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+
+@pytest.fixture(scope='module')
+def site(engine, seeded):
+    """Flask-застосунок, чиї сесії (маршрути, кошик, каталог меню) ходять у тестову БД."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setitem(shared.db.Session.kw, 'bind', engine)
+        patch.setattr(shared.menu_cache, 'engine', engine)
+        yield app
+
+
+@pytest.fixture(scope='module')
+def async_engine(engine):
+    # NullPool - кожен asyncio.run() зі своїм event loop, з'єднання між ними не переносяться
+    async_engine = create_async_engine(engine.url.set(drivername='postgresql+asyncpg'), poolclass=NullPool)
+    yield async_engine
+    asyncio.run(async_engine.dispose())
+
+
+@contextmanager
+def captured(sync_engine):
+    """SQL, який пішов у БД, з параметрами - рівно те, що побудував код, а не копія запиту в тесті."""
+    seen = []
+
+    def remember(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith('EXPLAIN'):
+            seen.append((statement, parameters))
+
+    event.listen(sync_engine, 'before_cursor_execute', remember)
+    try:
+        yield seen
+    finally:
+        event.remove(sync_engine, 'before_cursor_execute', remember)
+
+
+def index_names(plan):
+    """Назви індексів з усіх вузлів плану (Index Scan, Index Only Scan, Bitmap Index Scan)."""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    names, nodes = set(), [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if 'Index Name' in node:
+            names.add(node['Index Name'])
+        nodes.extend(node.get('Plans', []))
+    return names
+
+
+def explain(engine, statement, parameters):
+    with engine.connect() as conn:
+        return index_names(conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar())
+
+
+async def explain_async(async_engine, statement, parameters):
+    async with async_engine.connect() as conn:
+        plan = (await conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)).scalar()
+    return index_names(plan)
+
+
+# Сайт - запити ловимо з самих маршрутів через тестовий клієнт
+
+def login(site, user_id):
+    client = site.test_client()
+    with client.session_transaction() as session:
+        session['_user_id']   = str(user_id)
+        session['_fresh']     = True
+        session['csrf_token'] = 'test'
+    return client
+
+
+def fetch(engine, client, url, **params):
+    """GET маршруту; повертає відповідь і весь SQL, який він виконав."""
+    # Кеш меню і фрагменти сторінок скидаємо - інакше маршрут може не дійти до БД
+    menu_catalogue.invalidate()
+    with captured(engine) as seen:
+        response = client.get(url, query_string=params)
+    assert response.status_code == 200, (url, response.status_code)
+    return response, seen
+
+
+def reading(seen, table, *fragments):
+    """Перший запит маршруту, що читає з table (і містить усі fragments); юзер, кошик тощо - повз."""
+    source = re.compile(rf'\bFROM {table}\b')
+    return next((statement, parameters) for statement, parameters in seen
+                if source.search(statement) and all(f in statement for f in fragments))
+
+
+def route_pages(engine, client, url, table):
+    """Плани першої і другої сторінки списку (друга - з курсором, як після «Показати ще»)."""
+    first, seen_first = fetch(engine, client, url, format='json')
+    next_cursor = first.get_json()['next_cursor']
+    assert next_cursor, "замало рядків для другої сторінки"
+    _, seen_second = fetch(engine, client, url, format='json', cursor=next_cursor)
+    return [explain(engine, *reading(seen, table)) for seen in (seen_first, seen_second)]
+
+
+def test_my_orders_page_uses_user_time_index(engine, site):
+    for indexes in route_pages(engine, login(site, USER_ID), '/my_orders', 'orders'):
+        assert 'ix_orders_user_time' in indexes
+
+
+def test_my_reservations_page_uses_user_time_index(engine, site):
+    for indexes in route_pages(engine, login(site, USER_ID), '/my_reservations', 'reservation'):
+        assert 'ix_reservation_user_time' in indexes
+
+
+def test_admin_reservations_page_uses_time_index(engine, site):
+    for indexes in route_pages(engine, login(site, ADMIN_ID), '/reservations_check', 'reservation'):
+        assert 'ix_reservation_time' in indexes
+
+
+def test_position_reviews_page_uses_menu_time_index(engine, site):
+    for indexes in route_pages(engine, site.test_client(), f'/position/{MENU_ID}', 'reviews'):
+        assert 'ix_reviews_menu_time' in indexes
+
+
+def test_user_reviewed_check_uses_menu_user_index(engine, site):
+    _, seen = fetch(engine, login(site, USER_ID), f'/position/{MENU_ID}')
+    assert 'ix_reviews_menu_user' in explain(engine, *reading(seen, 'reviews', 'reviews.user_id = '))
+
+
+def test_my_order_uses_primary_keys(engine, site):
+    client   = login(site, USER_ID)
+    order_id = client.get('/my_orders', query_string={'format': 'json'}).get_json()['items'][0]['id']
+    _, seen  = fetch(engine, client, f'/my_order/{order_id}')
+    assert 'orders_pkey' in explain(engine, *reading(seen, 'orders'))
+    assert 'order_items_pkey' in explain(engine, *reading(seen, 'order_items'))
+
+
+def test_checkout_reads_basket_by_key_and_menu_in_one_query(engine, site):
+    client = login(site, USER_ID)
+    for menu_id in (3, 5, MENU_ID):
+        client.post(f'/position/{menu_id}', data={'csrf_token': 'test', 'num': 2})
+
+    response, seen = fetch(engine, client, '/create_order')
+    assert 'Страва 7' in response.get_data(as_text=True)
+    assert 'baskets_pkey' in explain(engine, *reading(seen, 'baskets'))
+    # Ціни всього кошика - одним WHERE menu.id IN (...), без запиту на кожну страву
+    assert len([s for s, _ in seen if re.search(r'\bFROM menu\b', s)]) == 1
+
+
+def test_hall_map_uses_exclusion_index(engine, site):
+    _, seen = fetch(engine, login(site, USER_ID), '/reserved', time=f'{BUSY_DAY}T19:00', duration=120)
+    assert 'reservation_no_overlap' in explain(engine, *reading(seen, 'reservation'))
+
+
+def test_day_grid_uses_exclusion_index(engine, site):
+    response, seen = fetch(engine, login(site, USER_ID), '/api/availability', date=BUSY_DAY)
+    assert any(table['busy'] != '0' for table in response.get_json()['tables'])
+    assert 'reservation_no_overlap' in explain(engine, *reading(seen, 'reservation'))
+
+
+# Бот
+
+def test_bot_active_orders_page_uses_partial_index(engine, async_engine, seeded):
+    Session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def run():
+        async with Session() as cursor:
+            with captured(async_engine.sync_engine) as first:
+                page = await orders_pager.fetch(cursor)
+            key = (page.rows[-1].order_time, page.rows[-1].id)
+            with captured(async_engine.sync_engine) as second:
+                await orders_pager.fetch(cursor, key)
+        return [(first[0], await explain_async(async_engine, *first[0])),
+                (second[0], await explain_async(async_engine, *second[0]))]
+
+    for (statement, _), indexes in asyncio.run(run()):
+        # Умова часткового індексу має бути в самому SQL, а не в параметрі
+        assert "'delivered'" in statement
+        assert 'ix_orders_active_time' in indexes
+
+
+def test_identity_lookup_uses_chat_id_index(async_engine, seeded, monkeypatch):
+    monkeypatch.setattr(bot.identity, 'AsyncSession', async_sessionmaker(async_engine, expire_on_commit=False))
+
+    async def run():
+        with captured(async_engine.sync_engine) as seen:
+            user = await IdentityCache().resolve(LINKED_CHAT)
+        return user, await explain_async(async_engine, *seen[0])
+
+    user, indexes = asyncio.run(run())
+    assert user.id == USER_ID
+    assert 'ix_users_telegram_chat_id' in indexes
+
+
+def test_telegram_code_lookup_uses_unique_index(async_engine, seeded):
+    Session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def run():
+        async with Session() as cursor:
+            with captured(async_engine.sync_engine) as seen:
+                await cursor.scalar(select(TelegramCode).filter_by(code='00000042'))
+        return await explain_async(async_engine, *seen[0])
+
+    assert 'telegram_codes_code_key' in asyncio.run(run())
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+
+from sqlalchemy.exc import IntegrityError
+
+from shared.db import Users, Table, Reservation
+from shared.availability import is_booking_conflict, BOOKING_CONFLICT_MESSAGE
+
+
+RACERS = 10
+START  = datetime(2030, 1, 1, 19, 0)
+
+
+def seed(db):
+    with db() as cursor:
+        table = Table(number=1, type_table='1-2', label='Біля вікна', x=0, y=0)
+        users = [Users(nickname=f'racer{i}', password='-', email=f'racer{i}@example.com') for i in range(RACERS)]
+        cursor.add_all([table, *users])
+        cursor.commit()
+        return table.id, [u.id for u in users]
+
+
+def book(db, table_id, user_id, start, end, barrier=None):
+    """Той самий шлях, що у reserved(): add + flush, IntegrityError 23P01 - повідомлення юзеру."""
+    with db() as cursor:
+        cursor.add(Reservation(table_id=table_id, user_id=user_id, time_start=start, time_end=end))
+        if barrier:
+            barrier.wait()
+        try:
+            cursor.flush()
+        except IntegrityError as e:
+            cursor.rollback()
+            if not is_booking_conflict(e):
+                raise
+            return BOOKING_CONFLICT_MESSAGE
+        cursor.commit()
+        return None
+
+
+def test_concurrent_bookings_of_one_slot_let_exactly_one_through(db):
+    table_id, user_ids = seed(db)
+    barrier = threading.Barrier(RACERS, timeout=30)
+
+    # Різні, але перетинні проміжки - конфлікт не зводиться до однакових рядків
+    def racer(i):
+        start = START + timedelta(minutes=10 * i)
+        return book(db, table_id, user_ids[i], start, start + timedelta(hours=2), barrier)
+
+    with ThreadPoolExecutor(RACERS) as pool:
+        results = list(pool.map(racer, range(RACERS)))
+
+    assert results.count(None) == 1
+    assert results.count(BOOKING_CONFLICT_MESSAGE) == RACERS - 1
+    with db() as cursor:
+        assert cursor.query(Reservation).filter_by(table_id=table_id).count() == 1
+
+
+def test_back_to_back_bookings_do_not_conflict(db):
+    table_id, user_ids = seed(db)
+
+    # [19:00, 21:00) і [21:00, 23:00) - межа не входить у проміжок
+    assert book(db, table_id, user_ids[0], START, START + timedelta(hours=2)) is None
+    assert book(db, table_id, user_ids[1], START + timedelta(hours=2), START + timedelta(hours=4)) is None
+
+
+def test_moving_a_booking_onto_a_taken_slot_is_rejected(db):
+    table_id, user_ids = seed(db)
+    assert book(db, table_id, user_ids[0], START, START + timedelta(hours=2)) is None
+    assert book(db, table_id, user_ids[1], START + timedelta(hours=3), START + timedelta(hours=4)) is None
+
+    # Як у edit_reservation(): UPDATE теж перевіряє exclusion constraint
+    with db() as cursor:
+        moved = cursor.query(Reservation).filter_by(user_id=user_ids[1]).one()
+        moved.time_start = START + timedelta(hours=1)
+        moved.time_end   = START + timedelta(hours=3)
+        try:
+            cursor.flush()
+        except IntegrityError as e:
+            assert is_booking_conflict(e)
+        else:
+            raise AssertionError("перетин броней пройшов UPDATE")
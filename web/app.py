@@ -1,17 +1,31 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, g
+from flask import Flask, render_template, request, redirect, url_for, flash, session, g, jsonify
 from flask_login import login_required, current_user, login_user, logout_user
-from shared.db import Session, Users, Menu, Orders, Reservation, Table, Reviews, TelegramCode
+from shared.db import (Session, Users, Menu, Orders, OrderItem, Reservation, Table, Reviews, TelegramCode,
+                       notify_bot_identity, notify_menu_changed)
+from shared.menu_cache import menu_catalogue
+from shared.mailer import enqueue_email
+from shared.broadcast import create_campaign
+from shared.images import ingest_image, default_file, menu_picture, smallest_file, InvalidImage
+from web.assets import init_assets
+from web.compression import init_compression, csrf_valid
+from web.fragments import fragment_cache
+from web.pagination import keyset_page, page_args, wants_json, page_url
+from web.basket import get_basket, basket_size, set_qty, remove_item, clear_basket, merge_basket_on_login, MAX_QTY
+from markupsafe import Markup
+from shared.availability import (hall_availability, day_grid, is_booking_conflict, next_slot, parse_slot,
+                                 RESERVATION_DURATIONS, DEFAULT_DURATION, BOOKING_CONFLICT_MESSAGE)
 from flask_login import LoginManager
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-import uuid
+import tempfile
 import secrets
 from geopy.distance import geodesic
-from sqlalchemy.orm import joinedload
-from sqlalchemy import func
-from flask_mail import Mail, Message
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import func, or_, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from itsdangerous import URLSafeTimedSerializer
 import random, string
+import re
 from dotenv import load_dotenv
 import os
 
@@ -31,6 +45,19 @@ app.config['MAX_FORM_PARTS'] = 500
 app.config['SESSION_COOKIE_SAMESITE'] = 'Strict'
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 
+# Статика з відбитками в іменах і Cache-Control: immutable
+init_assets(app)
+# gzip/brotli для HTML і JSON; статика стискається один раз при старті
+init_compression(app)
+# Зміни меню з бота та інших воркерів - через NOTIFY; потік стартує в процесі воркера, після fork
+app.before_request(menu_catalogue.listen)
+
+# src/srcset фото страви для шаблонів
+app.jinja_env.globals['menu_picture'] = menu_picture
+app.jinja_env.globals['smallest_file'] = smallest_file
+app.jinja_env.globals['basket_size'] = basket_size
+app.jinja_env.globals['page_url'] = page_url
+
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -53,16 +80,7 @@ TABLE_NUM = {
 
 }
 
-# Конфігурація email
-app.config['MAIL_SERVER']   = 'smtp.gmail.com'
-app.config['MAIL_PORT']     = 587
-app.config['MAIL_USE_TLS']  = True
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = ('Останній Прихисток', os.getenv('MAIL_USERNAME'))
-
-mail = Mail(app)
-
+# Листи відправляє окремий воркер (run_mail_worker.py), SMTP налаштовується в shared/mailer.py
 ADMIN_EMAIL = os.getenv('ADMIN_EMAIL')
 
 # Серіалізатор - для підписання токенів при скиданні паролю
@@ -70,18 +88,22 @@ SERIALIZER  = URLSafeTimedSerializer(app.config['SECRET_KEY'])
 
 
 # Email-функції
-def send_email(to, subject, body_html):
-    """Базова функція відправки."""
-    try:
-        msg = Message(subject=subject, recipients=[to], html=body_html)
-        mail.send(msg)
-        return True
-    except Exception as e:
-        print(f"[MAIL ERROR] {e}")
-        return False
-
-
-def email_new_reservation(admin_email, user_nickname, user_email, table_number, table_label, time_start):
+def send_email(to, subject, body_html, cursor=None):
+    """
+    Базова функція відправки - ставить лист у чергу email_outbox.
+    Якщо передано cursor, лист запишеться в тій самій транзакції що й зміни запиту
+    (caller робить commit). Самі листи відправляє run_mail_worker.py.
+    """
+    if cursor is not None:
+        enqueue_email(cursor, to, subject, body_html)
+        return
+
+    with Session() as own_cursor:
+        enqueue_email(own_cursor, to, subject, body_html)
+        own_cursor.commit()
+
+
+def email_new_reservation(admin_email, user_nickname, user_email, table_number, table_label, time_start, cursor=None):
     """Адміну - повідомлення про нове бронювання."""
     send_email(admin_email,
         subject="☢ Нове бронювання | Останній Прихисток",
@@ -94,10 +116,10 @@ def email_new_reservation(admin_email, user_nickname, user_email, table_number,
             <hr style="border-color:#4cff80; opacity:0.3;">
             <p style="opacity:0.6; font-size:12px;">Останній Прихисток — Система бронювань</p>
         </div>
-        """)
+        """, cursor=cursor)
 
 def email_edit_reservation(admin_email, user_nickname, user_email, old_table_number, old_table_label, old_time_start,
-                          new_table_number, new_table_label, new_time_start):
+                          new_table_number, new_table_label, new_time_start, cursor=None):
     """Адміну - оновлення бронювання."""
     send_email(admin_email,
         subject="☢ Оновлення бронювання | Останній Прихисток",
@@ -129,13 +151,14 @@ def email_edit_reservation(admin_email, user_nickname, user_email, old_table_num
     <hr style="border-color:#4cff80; opacity:0.3; margin-top: 20px;">
     <p style="opacity:0.6; font-size:12px; margin-bottom: 0;">Останній Прихисток — Система бронювань v2.0.4</p>
 </div>
-        """)
+        """, cursor=cursor)
 
-def email_order_confirmed(user_email, user_nickname, order_id, order_list, total_price):
-    """Юзеру - замовлення прийняти."""
+def email_order_confirmed(user_email, user_nickname, order_id, items, total_price, cursor=None):
+    """Юзеру - замовлення прийняти. items - [(назва, кількість, ціна за одиницю)]."""
     items_html = ''.join(
-        f"<tr><td style='padding:4px 12px;'>{name}</td><td style='padding:4px 12px;'>× {qty}</td></tr>"
-        for name, qty in order_list.items()
+        f"<tr><td style='padding:4px 12px;'>{name}</td><td style='padding:4px 12px;'>× {qty}</td>"
+        f"<td style='padding:4px 12px;'>{qty * unit_price} ₴</td></tr>"
+        for name, qty, unit_price in items
     )
     send_email(user_email,
         subject=f"✅ Замовлення #{order_id} прийнято | Останній Прихисток",
@@ -145,17 +168,17 @@ def email_order_confirmed(user_email, user_nickname, order_id, order_list, total
             <p>Вітаємо, <b>{user_nickname}</b>!</p>
             <p>Ваше замовлення <b>#{order_id}</b> успішно оформлено.</p>
             <table style="border-collapse:collapse; margin:12px 0;">
-                <tr style="opacity:0.6;"><th style="padding:4px 12px; text-align:left;">Страва</th><th style="padding:4px 12px;">К-сть</th></tr>
+                <tr style="opacity:0.6;"><th style="padding:4px 12px; text-align:left;">Страва</th><th style="padding:4px 12px;">К-сть</th><th style="padding:4px 12px;">Сума</th></tr>
                 {items_html}
             </table>
             <p><b>Загальна сума: {total_price} ₴</b></p>
             <hr style="border-color:#4cff80; opacity:0.3;">
             <p style="opacity:0.6; font-size:12px;">Останній Прихисток — Кухня працює</p>
         </div>
-        """)
+        """, cursor=cursor)
 
 
-def email_reservation_cancelled(user_email, user_nickname, table_number, table_label, time_start):
+def email_reservation_cancelled(user_email, user_nickname, table_number, table_label, time_start, cursor=None):
     """Юзеру - бронювання скасовано адміном."""
     send_email(user_email,
         subject="⚠ Бронювання скасовано | Останній Прихисток",
@@ -170,10 +193,10 @@ def email_reservation_cancelled(user_email, user_nickname, table_number, table_l
             <hr style="border-color:#ff5050; opacity:0.3;">
             <p style="opacity:0.6; font-size:12px;">Останній Прихисток</p>
         </div>
-        """)
+        """, cursor=cursor)
 
 
-def email_user_cancelled_reservation(admin_email, user_nickname, user_email, table_number, table_label, time_start):
+def email_user_cancelled_reservation(admin_email, user_nickname, user_email, table_number, table_label, time_start, cursor=None):
     """Адміну - юзер сам скасував бронювання."""
     send_email(admin_email,
         subject="⚠ Бронювання скасовано юзером | Останній Прихисток",
@@ -186,35 +209,38 @@ def email_user_cancelled_reservation(admin_email, user_nickname, user_email, tab
             <hr style="border-color:#ffc800; opacity:0.3;">
             <p style="opacity:0.6; font-size:12px;">Останній Прихисток — Система бронювань</p>
         </div>
-        """)
+        """, cursor=cursor)
 
 
-def email_new_menu_items(all_users_emails, new_items):
-    """Всім юзерам - нові страви в меню."""
+def email_new_menu_items(new_items, cursor):
+    """
+    Всім юзерам - нові страви в меню.
+    Лист рендериться один раз і стає кампанією розсилки (shared/broadcast.py) -
+    самі листи відправляє воркер, а не адмінський запит.
+    """
     items_html = ''.join(
         f"<li style='margin:6px 0;'><b>{item.name}</b> — {item.price} ₴</li>"
         for item in new_items
     )
-    for email in all_users_emails:
-        send_email(email,
-            subject="🍽 Нові страви в меню | Останній Прихисток",
-            body_html=f"""
-            <div style="font-family:monospace; background:#0a0f0a; color:#4cff80; padding:24px; border:1px solid #4cff80;">
-                <h2 style="color:#4cff80;">🍽 НОВІ СТРАВИ В МЕНЮ</h2>
-                <p>Прихисток поповнив запаси! Нові позиції:</p>
-                <ul style="padding-left:20px;">{items_html}</ul>
-                <a href="http://localhost:5000/menu"
-                   style="display:inline-block; margin-top:12px; padding:10px 20px;
-                          background:#4cff80; color:#000; text-decoration:none; font-weight:bold;">
-                    ☰ Переглянути меню
-                </a>
-                <hr style="border-color:#4cff80; opacity:0.3; margin-top:16px;">
-                <p style="opacity:0.6; font-size:12px;">Останній Прихисток</p>
-            </div>
-            """)
-
-
-def email_reset_password(user_email, reset_url):
+    create_campaign(cursor,
+        subject="🍽 Нові страви в меню | Останній Прихисток",
+        body_html=f"""
+        <div style="font-family:monospace; background:#0a0f0a; color:#4cff80; padding:24px; border:1px solid #4cff80;">
+            <h2 style="color:#4cff80;">🍽 НОВІ СТРАВИ В МЕНЮ</h2>
+            <p>Прихисток поповнив запаси! Нові позиції:</p>
+            <ul style="padding-left:20px;">{items_html}</ul>
+            <a href="http://localhost:5000/menu"
+               style="display:inline-block; margin-top:12px; padding:10px 20px;
+                      background:#4cff80; color:#000; text-decoration:none; font-weight:bold;">
+                ☰ Переглянути меню
+            </a>
+            <hr style="border-color:#4cff80; opacity:0.3; margin-top:16px;">
+            <p style="opacity:0.6; font-size:12px;">Останній Прихисток</p>
+        </div>
+        """)
+
+
+def email_reset_password(user_email, reset_url, cursor=None):
     """Юзеру - скидання пароля."""
     send_email(user_email,
         subject="🔑 Скидання пароля | Останній Прихисток",
@@ -232,7 +258,7 @@ def email_reset_password(user_email, reset_url):
             <hr style="border-color:#4cff80; opacity:0.3;">
             <p style="opacity:0.6; font-size:12px;">Останній Прихисток</p>
         </div>
-        """)
+        """, cursor=cursor)
 
 
 
@@ -276,7 +302,7 @@ def home():
 @app.route("/register", methods = ['GET','POST'])
 def register():
     if request.method == 'POST':
-        if request.form.get("csrf_token") != session["csrf_token"]:
+        if not csrf_valid():
             return "Запит заблоковано!", 403
         nickname = request.form['nickname']
         email = request.form['email']
@@ -297,6 +323,7 @@ def register():
             cursor.commit()
             cursor.refresh(new_user)
             login_user(new_user)
+            merge_basket_on_login(new_user.id)
             return redirect(url_for('home'))
     return render_template('register.html',csrf_token=session["csrf_token"])
 
@@ -304,7 +331,7 @@ def register():
 @app.route("/login", methods = ["GET","POST"])
 def login():
     if request.method == 'POST':
-        if request.form.get("csrf_token") != session["csrf_token"]:
+        if not csrf_valid():
             return "Запит заблоковано!", 403
 
         nickname = request.form['nickname']
@@ -314,6 +341,7 @@ def login():
             user = cursor.query(Users).filter_by(nickname = nickname).first()
             if user and user.check_password(password):
                 login_user(user)
+                merge_basket_on_login(user.id)
                 return redirect(url_for('home'))
 
             flash('Неправильний nickname або пароль!', 'danger')
@@ -349,7 +377,7 @@ def profile():
 @app.route('/profile/change_password', methods=['POST'])
 @login_required
 def change_password():
-    if request.form.get("csrf_token") != session["csrf_token"]:
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
     old_password = request.form['old_password']
@@ -379,16 +407,123 @@ def change_password():
 
 
 # Меню
+MENU_PAGE_SIZE = 24
+MENU_MAX_PAGE_SIZE = 60
+MENU_SORTS = ('default', 'price_asc', 'price_desc')
+
+
+def menu_tsquery(text):
+    """Перетворює введений текст у префіксний tsquery: 'бур сир' -> 'бур:* & сир:*'."""
+    words = re.findall(r'\w+', text.lower())
+    return ' & '.join(f"{w}:*" for w in words)
+
+
+def search_menu(cursor, q='', price_min=None, price_max=None, sort='default', after=None, limit=MENU_PAGE_SIZE):
+    """
+    Пошук активних страв з keyset-пагінацією.
+    after - курсор (ціна, id) останньої страви попередньої сторінки.
+    Повертає (страви, курсор наступної сторінки або None).
+    """
+    price = Menu.price
+    query = cursor.query(Menu).filter(Menu.active == True)
+
+    if q:
+        # Триграмний індекс ловить шматок назви, GIN по search_vector - слова з інгредієнтів і опису
+        conditions = [Menu.name.icontains(q, autoescape=True)]
+        ts = menu_tsquery(q)
+        if ts:
+            conditions.append(Menu.search_vector.op('@@')(func.to_tsquery('simple', ts)))
+        query = query.filter(or_(*conditions))
+
+    if price_min is not None:
+        query = query.filter(price >= price_min)
+    if price_max is not None:
+        query = query.filter(price <= price_max)
+
+    if sort == 'price_asc':
+        if after:
+            query = query.filter(tuple_(price, Menu.id) > tuple_(*after))
+        query = query.order_by(price.asc(), Menu.id.asc())
+    elif sort == 'price_desc':
+        if after:
+            query = query.filter(tuple_(price, Menu.id) < tuple_(*after))
+        query = query.order_by(price.desc(), Menu.id.desc())
+    else:
+        if after:
+            query = query.filter(Menu.id > after[1])
+        query = query.order_by(Menu.id.asc())
+
+    # Беремо на один рядок більше - так дізнаємось чи є наступна сторінка без COUNT(*)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1].price}:{rows[-1].id}"
+
+    return rows, next_cursor
+
+
 @app.route('/menu')
 def menu():
-    with Session() as db:
-        all_positions = db.query(Menu).filter_by(active=True).all()
+    # Картки підвантажує сам шаблон сторінками з /api/menu; фільтри з URL - стартові значення
+    sort = request.args.get('sort', 'default')
     return render_template('menu.html',
-                           all_positions=all_positions,
+                           page_size=MENU_PAGE_SIZE,
+                           q=request.args.get('q', '').strip()[:100],
+                           price_min=request.args.get('price_min', type=int),
+                           price_max=request.args.get('price_max', type=int),
+                           sort=sort if sort in MENU_SORTS else 'default',
                            csrf_token=session.get('csrf_token', ''),
                            nonce=g.nonce)
 
 
+@app.route('/api/menu')
+def api_menu():
+    q         = request.args.get('q', '').strip()[:100]
+    price_min = request.args.get('price_min', type=int)
+    price_max = request.args.get('price_max', type=int)
+    sort      = request.args.get('sort', 'default')
+    limit     = request.args.get('limit', MENU_PAGE_SIZE, type=int)
+    raw_after = request.args.get('cursor')
+
+    if sort not in MENU_SORTS:
+        return jsonify(error='Невідоме сортування'), 400
+
+    after = None
+    if raw_after:
+        try:
+            after = tuple(int(part) for part in raw_after.split(':'))
+        except ValueError:
+            after = ()
+        if len(after) != 2:
+            return jsonify(error='Невірний курсор'), 400
+
+    limit = max(1, min(limit, MENU_MAX_PAGE_SIZE))
+
+    def render_page():
+        with Session() as cursor:
+            positions, next_cursor = search_menu(cursor, q, price_min, price_max, sort, after, limit)
+            items = [
+                {
+                    "id":          p.id,
+                    "name":        p.name,
+                    "ingredients": p.ingredients,
+                    "price":       p.price,
+                    "weight":      p.weight,
+                    "image":       menu_picture(p.file_name, p.images),
+                    "rating":       p.avg_rating,
+                    "rating_count": p.rating_count,
+                }
+                for p in positions
+            ]
+        return {"items": items, "next_cursor": next_cursor}
+
+    # Видача однакова для всіх - картки перебудовуються лише після змін у меню чи відгуках
+    page = fragment_cache.get_or_render(('api_menu', q, price_min, price_max, sort, after, limit),
+                                        ('menu', 'reviews'), render_page)
+    return jsonify(page)
+
+
 @app.route("/add_position", methods=['GET', 'POST'])
 @login_required
 def add_position():
@@ -396,30 +531,35 @@ def add_position():
         return redirect(url_for('home'))
 
     if request.method == "POST":
-        if request.form.get("csrf_token") != session["csrf_token"]:
+        if not csrf_valid():
             return "Запит заблоковано!", 403
 
         name = request.form['name']
         file = request.files.get('img')
         ingredients = request.form['ingredients']
         description = request.form['description']
-        price = request.form['price']
-        weight = request.form['weight']
+        price = request.form.get('price', type=int)
+        weight = request.form.get('weight', type=int)
+
+        if not price or not weight or price < 1 or weight < 1:
+            flash('Ціна і вага мають бути додатними цілими числами', 'danger')
+            return redirect(request.url)
 
         if not file or not file.filename:
             flash('Файл не вибрано або завантаження не вдалося', 'danger')
             return redirect(request.url)
 
-        unique_filename = f"{uuid.uuid4()}_{file.filename}"
-
-        upload_folder = os.path.join(app.root_path, 'static', 'menu')
-
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-
-        output_path = os.path.join(upload_folder, unique_filename)
-
-        file.save(output_path)
+        # Оригінал - у тимчасовий файл; на сайт потрапляють тільки перевірені нарізки без метаданих
+        fd, upload_path = tempfile.mkstemp(suffix='.upload')
+        os.close(fd)
+        try:
+            file.save(upload_path)
+            images = ingest_image(upload_path)
+        except InvalidImage as e:
+            flash(str(e), 'danger')
+            return redirect(request.url)
+        finally:
+            os.remove(upload_path)
 
         with Session() as cursor:
             new_position = Menu(
@@ -428,15 +568,16 @@ def add_position():
                 description=description,
                 price=price,
                 weight=weight,
-                file_name=unique_filename  # Зберігаємо тільки ім'я файлу, а не шлях
+                file_name=default_file(images),  # Зберігаємо тільки ім'я файлу, а не шлях
+                images=images
             )
             cursor.add(new_position)
-            cursor.commit()
-            cursor.refresh(new_position)
 
-            # Розсилка про нову страву
-            all_emails = [u.email for u in cursor.query(Users).with_entities(Users.email).all()]
-            email_new_menu_items(all_emails, [new_position])
+            # Розсилка про нову страву - кампанія в тій самій транзакції, що й страва
+            email_new_menu_items([new_position], cursor=cursor)
+            notify_menu_changed(cursor)
+            cursor.commit()
+            menu_catalogue.invalidate()
 
         flash('Позицію додано успішно!', 'success')
         return redirect(url_for('menu'))
@@ -446,15 +587,19 @@ def add_position():
 @app.route('/position/<int:menu_id>', methods=['GET', 'POST'])
 def position(menu_id):
     if request.method == 'POST':
-        if request.form.get("csrf_token") != session["csrf_token"]:
+        if not csrf_valid():
             return "Запит заблоковано!", 403
 
-        position_name = request.form.get('name')
-        position_num  = request.form.get('num')
+        dish = menu_catalogue.get(menu_id)
+        if not dish or not dish.active:
+            flash('Позицію не знайдено', 'danger')
+            return redirect(url_for('menu'))
 
-        basket = session.get('basket', {})
-        basket[position_name] = position_num
-        session['basket'] = basket
+        try:
+            set_qty(menu_id, request.form.get('num', 1))
+        except ValueError:
+            flash('Некоректна кількість', 'danger')
+            return redirect(url_for('position', menu_id=menu_id))
 
         flash('Позицію додано у кошик!')
 
@@ -465,19 +610,63 @@ def position(menu_id):
         return redirect(url_for('position', menu_id=menu_id))
 
 
+    after, limit = page_args(REVIEW_COLUMNS, REVIEWS_PAGE_SIZE)
+    fragments = fragment_cache.get_or_render(('position', menu_id, after, limit), ('menu', 'reviews'),
+                                             lambda: render_position_fragments(menu_id, after, limit))
+    if not fragments:
+        if wants_json():
+            return jsonify(error='Позицію не знайдено'), 404
+        flash('Позицію не знайдено', 'danger')
+        return redirect(url_for('menu'))
+
+    if wants_json():
+        return jsonify(items=fragments['review_items'], next_cursor=fragments['next_cursor'])
+
+    # Відгук юзера може бути на іншій сторінці списку - перевіряємо окремо, по індексу
+    user_reviewed = False
+    if current_user.is_authenticated:
+        with Session() as cursor:
+            user_reviewed = cursor.query(Reviews.id)\
+                .filter_by(menu_id=menu_id, user_id=current_user.id)\
+                .first() is not None
+
+    # Персональне підставляється після кешу: кнопки видалення тут, nonce і csrf - у самому шаблоні
+    page = dict(fragments, reviews=fill_review_actions(fragments['reviews'], fragments['authors'], menu_id))
+
+    return render_template('position.html',
+                           csrf_token=session["csrf_token"],
+                           position=fragments['position'],
+                           fragments=page,
+                           user_reviewed=user_reviewed,
+                           nonce=g.nonce)
+
+
+REVIEW_ACTIONS_MARKER = re.compile(r'<!--review-actions:(\d+)-->')
+REVIEW_COLUMNS        = (Reviews.created_at, Reviews.id)
+REVIEWS_PAGE_SIZE     = 20
+
+
+def position_macros():
+    return app.jinja_env.get_template('fragments/position.html').module
+
+
+def render_position_fragments(menu_id, after=None, limit=REVIEWS_PAGE_SIZE):
+    """
+    Спільні для всіх юзерів частини сторінки страви (фото, опис, рейтинг, сторінка відгуків) - готовим HTML.
+    None - страви немає або вона вимкнена.
+    """
     with Session() as cursor:
         us_position = cursor.query(Menu).filter_by(active=True, id=menu_id).first()
 
         if not us_position:
-            flash('Позицію не знайдено', 'danger')
-            return redirect(url_for('menu'))
+            return None
 
         # joinedload() - підтягує усі дані юзера з відгуком одним разом
-        reviews_raw = cursor.query(Reviews)\
-            .options(joinedload(Reviews.user))\
-            .filter_by(menu_id=menu_id)\
-            .order_by(Reviews.created_at.desc())\
-            .all()
+        reviews_raw, next_cursor = keyset_page(
+            cursor.query(Reviews)
+                .options(joinedload(Reviews.user))
+                .filter_by(menu_id=menu_id),
+            REVIEW_COLUMNS, after, limit)
 
         reviews = [
             {
@@ -491,34 +680,56 @@ def position(menu_id):
             for r in reviews_raw
         ]
 
-        # Середній рейтинг
-        avg = cursor.query(func.avg(Reviews.rating)).filter_by(menu_id=menu_id).scalar()
-        avg_rating = round(float(avg), 1) if avg else None
-
-        # Чи залишав юзер відгук до цього
-        user_reviewed = False
-        if current_user.is_authenticated:
-            user_reviewed = bool(
-                cursor.query(Reviews).filter_by(
-                    menu_id=menu_id, user_id=current_user.id
-                ).first()
-            )
+        # Середній рейтинг - з агрегатів у самій страві, без AVG по відгуках
+        avg_rating = us_position.avg_rating
+        macros     = position_macros()
+
+        # Посилання будуються тільки з menu_id і курсора - фрагмент однаковий для всіх
+        next_url  = url_for('position', menu_id=menu_id, cursor=next_cursor) + '#reviews' if next_cursor else None
+        first_url = url_for('position', menu_id=menu_id) + '#reviews' if after else None
+
+        return {
+            "position": {"id": us_position.id, "name": us_position.name},
+            "photo":    macros.photo(us_position),
+            "info":     macros.info(us_position, avg_rating),
+            "summary":  macros.summary(us_position, avg_rating),
+            "reviews":  macros.review_list(reviews, next_url, first_url),
+            "authors":  {r["id"]: r["user_id"] for r in reviews},
+            "review_items": [{k: v for k, v in r.items() if k != "user_id"} for r in reviews],
+            "next_cursor":  next_cursor,
+        }
 
-    return render_template('position.html',
-                           csrf_token=session["csrf_token"],
-                           position=us_position,
-                           reviews=reviews,
-                           avg_rating=avg_rating,
-                           user_reviewed=user_reviewed,
-                           nonce=g.nonce)
+
+def fill_review_actions(reviews_html, authors, menu_id):
+    """Ставить кнопку «Видалити» на місце маркера - тільки автору відгуку або адміну."""
+    delete_form = position_macros().delete_review_form
+
+    def actions(match):
+        review_id = int(match.group(1))
+        if current_user.is_authenticated and (
+                current_user.id == authors.get(review_id) or current_user.nickname == 'Admin'):
+            return str(delete_form(review_id, menu_id, session["csrf_token"]))
+        return ''
+
+    return Markup(REVIEW_ACTIONS_MARKER.sub(actions, reviews_html))
 
 
 
 # Відгуки
+def change_menu_rating(cursor, menu_id, count_delta, sum_delta):
+    """Атомарно зсуває агрегати рейтингу страви в транзакції caller'а."""
+    cursor.execute(
+        update(Menu)
+        .where(Menu.id == menu_id)
+        .values(rating_count=Menu.rating_count + count_delta,
+                rating_sum=Menu.rating_sum + sum_delta)
+    )
+
+
 @app.route('/review/add/<int:menu_id>', methods=['POST'])
 @login_required
 def add_review(menu_id):
-    if request.form.get("csrf_token") != session["csrf_token"]:
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
     rating  = request.form.get('rating', type=int)
@@ -542,7 +753,9 @@ def add_review(menu_id):
                 rating=rating,
                 comment=comment if comment else None,
             ))
+            change_menu_rating(cursor, menu_id, +1, rating)
             cursor.commit()
+            fragment_cache.bump('reviews')
             flash('Дякуємо за відгук!', 'success')
 
     return redirect(url_for('position', menu_id=menu_id))
@@ -550,7 +763,7 @@ def add_review(menu_id):
 @app.route('/review/delete/<int:review_id>', methods=['POST'])
 @login_required
 def delete_review(review_id):
-    if request.form.get("csrf_token") != session["csrf_token"]:
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
     menu_id = request.form.get('menu_id', type=int)
@@ -567,8 +780,10 @@ def delete_review(review_id):
             flash('Немає прав для видалення', 'danger')
             return redirect(url_for('position', menu_id=menu_id))
 
+        change_menu_rating(cursor, review.menu_id, -1, -review.rating)
         cursor.delete(review)
         cursor.commit()
+        fragment_cache.bump('reviews')
         flash('Відгук видалено', 'success')
 
     return redirect(url_for('position', menu_id=menu_id))
@@ -578,54 +793,67 @@ def delete_review(review_id):
 # Замовлення
 @app.route('/create_order', methods=['GET','POST'])
 def create_order():
-    basket = session.get('basket', {})
+    basket = get_basket()
+
+    # Ціни беремо з кешу меню за id - максимум один запит на всі промахи
+    positions   = menu_catalogue.get_many(basket.keys()) if basket else {}
+    lines       = [(positions[menu_id], qty) for menu_id, qty in basket.items()
+                   if menu_id in positions and positions[menu_id].active]
+    total_price = sum(item.price * qty for item, qty in lines)
+
+    # Страви, які зняли з меню або видалили, прибираємо з кошика і кажемо про це
+    dropped = [menu_id for menu_id in basket if menu_id not in positions or not positions[menu_id].active]
+    if dropped:
+        for menu_id in dropped:
+            remove_item(menu_id)
+        names = ', '.join(positions[menu_id].name for menu_id in dropped if menu_id in positions)
+        flash(f"Більше недоступні й прибрані з кошика: {names}" if names
+              else "Деякі страви більше недоступні й прибрані з кошика", "warning")
 
     with Session() as cursor:
-        # Рахуємо суму замовлення
-        total_price = 0
-        for name, qty in basket.items():
-            pos = cursor.query(Menu).filter_by(name=name).first()
-            if pos:
-                total_price += pos.price * int(qty)
-
         if request.method == 'POST':
-            if request.form.get("csrf_token") != session["csrf_token"]:
+            if not csrf_valid():
                 return "Запит заблоковано!", 403
 
+            if dropped:
+                # Сума змінилась - хай юзер побачить новий кошик перед оформленням
+                return redirect(url_for('create_order'))
+
             if not current_user.is_authenticated:
                 flash("Для оформлення замовлення необхідно увійти в акаунт")
                 return redirect(url_for('login'))
 
-            if not basket:
+            if not lines:
                 flash("Кошик порожній")
                 return redirect(url_for('create_order'))
 
+            # Ціну фіксуємо в рядку замовлення - подальші зміни меню суму не змінять
+            order_items = [OrderItem(menu_id=item.id, qty=qty, unit_price=item.price) for item, qty in lines]
+
             new_order = Orders(
-                order_list=basket,
                 order_time=datetime.now(),
-                user_id=current_user.id
+                user_id=current_user.id,
+                items=order_items
             )
             cursor.add(new_order)
-            cursor.commit()
+            cursor.flush()   # отримуємо id замовлення для листа
 
             email_order_confirmed(
                 user_email=current_user.email,
                 user_nickname=current_user.nickname,
                 order_id=new_order.id,
-                order_list=basket,
-                total_price=total_price
+                items=[(item.name, qty, item.price) for item, qty in lines],
+                total_price=new_order.total,
+                cursor=cursor
             )
-            session.pop('basket', None)
+            clear_basket(cursor=cursor)
+            cursor.commit()
             flash('Замовлення успішно оформлено!')
             return redirect(url_for('my_orders'))
 
-        # Передаємо позиції щоб шаблон показав деталі
-        positions = cursor.query(Menu).filter(Menu.name.in_(basket.keys())).all() if basket else []
-
     return render_template('create_order.html',
-                           basket=basket,
+                           basket=lines,
                            total_price=total_price,
-                           positions=positions,
                            csrf_token=session['csrf_token'])
 
 
@@ -633,21 +861,45 @@ def create_order():
 @login_required
 def my_orders():
     with Session() as cursor:
-        us_orders = cursor.query(Orders).filter_by(user_id = current_user.id).all()
-    return render_template('my_orders.html', us_orders = us_orders)
+        columns = (Orders.order_time, Orders.id)
+        after, limit = page_args(columns)
+        # Склад з назвами страв - двома запитами на всю сторінку, без N+1
+        us_orders, next_cursor = keyset_page(
+            cursor.query(Orders)
+                .options(selectinload(Orders.items).joinedload(OrderItem.menu))
+                .filter_by(user_id = current_user.id),
+            columns, after, limit)
+
+        if wants_json():
+            return jsonify(items=[
+                {
+                    "id":         o.id,
+                    "order_time": o.order_time.isoformat(),
+                    "status":     o.status,
+                    "total":      o.total,
+                    "items":      [{"menu_id": i.menu_id, "name": i.name, "qty": i.qty, "unit_price": i.unit_price}
+                                   for i in o.items],
+                }
+                for o in us_orders
+            ], next_cursor=next_cursor)
+
+        return render_template('my_orders.html', us_orders = us_orders, next_cursor = next_cursor)
 
 
 @app.route('/my_order/<int:id>')
 @login_required
 def my_order(id):
     with Session() as cursor:
-        us_order = cursor.query(Orders).filter_by(id = id).first()
+        us_order = cursor.query(Orders)\
+            .options(selectinload(Orders.items).joinedload(OrderItem.menu))\
+            .filter_by(id = id)\
+            .first()
 
         if not us_order or (us_order.user_id != current_user.id and current_user.nickname != 'Admin'):
             flash('Замовлення не знайдено або у вас немає доступу.', 'danger')
             return redirect(url_for('my_orders'))
 
-        total_price = sum(int(cursor.query(Menu).filter_by(name=i).first().price) * int(cnt) for i, cnt in us_order.order_list.items())
+        total_price = us_order.total
 
         return render_template('my_order.html', order=us_order, total_price=total_price)
 
@@ -655,7 +907,7 @@ def my_order(id):
 @app.route('/cancel_order/<int:id>', methods=['POST'])
 @login_required
 def cancel_order(id):
-    if request.form.get('csrf_token') != session['csrf_token']:
+    if not csrf_valid():
         return 'Запит заблоковано!', 403
 
     with Session() as cursor:
@@ -677,76 +929,106 @@ def cancel_order(id):
 @login_required
 def reserved():
     message = None
+    # Схема залу показує зайнятість на вибраний проміжок (за замовчуванням - найближчі 2 години)
+    slot = parse_slot(request.args.get('time'), request.args.get('duration')) \
+        or (next_slot(), next_slot() + timedelta(minutes=DEFAULT_DURATION))
 
     if request.method == "POST":
-        if request.form.get("csrf_token") != session["csrf_token"]:
+        if not csrf_valid():
             return "Запит заблоковано!", 403
 
         table_id   = request.form.get('table_id')
-        time_start = request.form.get('time')
         user_lat   = request.form.get('latitude')
         user_lon   = request.form.get('longitude')
+        posted     = parse_slot(request.form.get('time'), request.form.get('duration'))
 
-        if not user_lat or not user_lon:
+        if not posted:
+            message = 'Оберіть дату та час бронювання.'
+        elif not user_lat or not user_lon:
+            slot    = posted
             message = 'Дозвольте доступ до геолокації.'
         else:
+            slot = posted
+            time_start, time_end = posted
             distance = geodesic(RESTAURANT_COORDS, (float(user_lat), float(user_lon))).km
             if distance > BOOKING_RADIUS_KM:
                 message = f"Ви за межами зони бронювання ({distance:.1f} км від нас)."
             else:
                 with Session() as cursor:
-                    existing = cursor.query(Reservation).filter_by(user_id=current_user.id).first()
+                    # Активна - та, що ще не закінчилась
+                    existing = cursor.query(Reservation)\
+                        .filter(Reservation.user_id == current_user.id, Reservation.time_end > datetime.now())\
+                        .first()
                     if existing:
                         message = 'У вас вже є активна бронь. Скасуйте її щоб створити нову.'
                     else:
-                        table_taken = cursor.query(Reservation).filter_by(table_id=table_id).first()
-                        if table_taken:
-                            message = 'Цей столик вже заброньований. Оберіть інший.'
-                        else:
-                            new_res = Reservation(table_id=table_id, time_start=time_start, user_id=current_user.id)
+                        new_res = Reservation(table_id=table_id, time_start=time_start,
+                                              time_end=time_end, user_id=current_user.id)
+                        try:
+                            # Перетин з іншою бронню відхиляє exclusion constraint прямо на INSERT
                             cursor.add(new_res)
-                            cursor.commit()
-
-                            # Отримуємо дані столика поки сесія відкрита
-                            table = cursor.query(Table).filter_by(id=table_id).first()
-                            email_new_reservation(
-                                admin_email=ADMIN_EMAIL,
-                                user_nickname=current_user.nickname,
-                                user_email=current_user.email,
-                                table_number=table.number,
-                                table_label=table.label,
-                                time_start=time_start
-                            )
-                            message = f'✅ Столик №{table.number} ({table.label}) успішно заброньовано!'
-
+                            cursor.flush()
+                        except IntegrityError as e:
+                            cursor.rollback()
+                            if not is_booking_conflict(e):
+                                raise
+                            message = BOOKING_CONFLICT_MESSAGE
+
+                    if message is None:
+                        # Отримуємо дані столика поки сесія відкрита
+                        table = cursor.query(Table).filter_by(id=table_id).first()
+                        email_new_reservation(
+                            admin_email=ADMIN_EMAIL,
+                            user_nickname=current_user.nickname,
+                            user_email=current_user.email,
+                            table_number=table.number,
+                            table_label=table.label,
+                            time_start=time_start.strftime('%d.%m.%Y %H:%M'),
+                            cursor=cursor
+                        )
+                        cursor.commit()
+                        message = f'✅ Столик №{table.number} ({table.label}) успішно заброньовано!'
+
+    slot_start, slot_end = slot
     with Session() as cursor:
-        all_tables = cursor.query(Table).all()
-        reserved_ids = {r.table_id for r in cursor.query(Reservation).all()}
-
-    # Перетворюємо об'єкти на словники для передачі
-    tables_json = [
-        {"id": t.id, "number": t.number, "type": t.type_table,
-         "label": t.label, "x": t.x, "y": t.y, "taken": t.id in reserved_ids}
-        for t in all_tables
-    ]
+        tables_json = hall_availability(cursor, slot_start, slot_end)
 
     return render_template('reserved.html',
                            tables=tables_json,
                            message=message,
+                           slot_time=slot_start.strftime('%Y-%m-%dT%H:%M'),
+                           slot_duration=int((slot_end - slot_start).total_seconds() // 60),
+                           durations=RESERVATION_DURATIONS,
                            csrf_token=session["csrf_token"],
                            nonce=g.nonce,
                            now=datetime.now().strftime('%Y-%m-%dT%H:%M'))
 
+@app.route('/api/availability')
+@login_required
+def api_availability():
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify(error='Невірна дата'), 400
+    party = request.args.get('party', type=int)
+
+    with Session() as cursor:
+        grid = day_grid(cursor, day, party)
+    return jsonify(grid)
+
+
 @app.route('/my_reservations')
 @login_required
 def my_reservations():
     with Session() as cursor:
+        columns = (Reservation.time_start, Reservation.id)
+        after, limit = page_args(columns)
         #.options(joinedload(Reservation.table)) - потрібно для того щоб уникнути "лінивої загрузки" і у нас підгрузило інфу про столи
-        reservations_raw = cursor.query(Reservation)\
-            .options(joinedload(Reservation.table))\
-            .filter_by(user_id=current_user.id)\
-            .order_by(Reservation.time_start.desc())\
-            .all()
+        reservations_raw, next_cursor = keyset_page(
+            cursor.query(Reservation)
+                .options(joinedload(Reservation.table))
+                .filter_by(user_id=current_user.id),
+            columns, after, limit)
 
         # Витягуємо всі дані поки сесія відкрита
         reservations = [
@@ -760,14 +1042,19 @@ def my_reservations():
             for r in reservations_raw
         ]
 
+    if wants_json():
+        return jsonify(items=[dict(r, time_start=r["time_start"].isoformat()) for r in reservations],
+                       next_cursor=next_cursor)
+
     return render_template("my_reservations.html", reservations=reservations,
+                           next_cursor=next_cursor,
                            csrf_token=session['csrf_token'])
 
 
 @app.route('/reservation/cancel/<int:res_id>', methods=['POST'])
 @login_required
 def cancel_reservation(res_id):
-    if request.form.get("csrf_token") != session["csrf_token"]:
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
     with Session() as cursor:
@@ -785,17 +1072,17 @@ def cancel_reservation(res_id):
         time_start   = res.time_start.strftime('%d.%m.%Y %H:%M')
 
         cursor.delete(res)
+        email_user_cancelled_reservation(
+            admin_email=ADMIN_EMAIL,
+            user_nickname=current_user.nickname,
+            user_email=current_user.email,
+            table_number=table_number,
+            table_label=table_label,
+            time_start=time_start,
+            cursor=cursor
+        )
         cursor.commit()
 
-    email_user_cancelled_reservation(
-        admin_email=ADMIN_EMAIL,
-        user_nickname=current_user.nickname,
-        user_email=current_user.email,
-        table_number=table_number,
-        table_label=table_label,
-        time_start=time_start
-    )
-
     flash('Бронювання скасовано.', 'success')
     return redirect(url_for('my_reservations'))
 
@@ -815,32 +1102,36 @@ def edit_reservation(id):
             return redirect(url_for("my_reservations"))
 
         if request.method == "POST":
-            if request.form.get("csrf_token") != session["csrf_token"]:
+            if not csrf_valid():
                 return "Запит заблоковано!", 403
 
-            new_time_str     = request.form["time"]
             new_table_id = request.form["table_id"]
+            new_slot     = parse_slot(request.form.get("time"), request.form.get("duration"))
+
+            if not new_slot:
+                flash("Оберіть дату та час бронювання.", "danger")
+                return redirect(url_for("edit_reservation", id=id))
 
-            new_time_dt = datetime.strptime(new_time_str, '%Y-%m-%dT%H:%M')
+            new_start, new_end = new_slot
 
             # Зберігаємо старі дані для листа адміну
             old_table_number = reserv.table.number
             old_table_label = reserv.table.label
             old_time_start = reserv.time_start
 
-            # Якщо столик змінився - перевіряємо що новий не зайнятий
-            if str(reserv.table_id) != str(new_table_id):
-                taken = cursor.query(Reservation).filter(
-                    Reservation.table_id == new_table_id,
-                    Reservation.id != id # поточний не рахуємо
-                ).first()
-                if taken:
-                    flash("Цей столик вже заброньований. Оберіть інший.", "danger")
-                    return redirect(url_for("edit_reservation", id=id))
-
-            reserv.time_start = new_time_dt
+            reserv.time_start = new_start
+            reserv.time_end   = new_end
             reserv.table_id   = int(new_table_id)
-            cursor.commit()
+
+            # Змінитись міг і столик, і час - перетин перевірить exclusion constraint на UPDATE
+            try:
+                cursor.flush()
+            except IntegrityError as e:
+                cursor.rollback()
+                if not is_booking_conflict(e):
+                    raise
+                flash(BOOKING_CONFLICT_MESSAGE, "danger")
+                return redirect(url_for("edit_reservation", id=id))
 
             new_table = cursor.query(Table).filter_by(id=int(new_table_id)).first()
 
@@ -853,8 +1144,10 @@ def edit_reservation(id):
                 old_time_start=old_time_start.strftime('%d.%m.%Y %H:%M'),  # ← strftime тут
                 new_table_number=new_table.number,
                 new_table_label=new_table.label,
-                new_time_start=new_time_dt.strftime('%d.%m.%Y %H:%M')  # ← і тут
+                new_time_start=new_start.strftime('%d.%m.%Y %H:%M'),  # ← і тут
+                cursor=cursor
             )
+            cursor.commit()
 
             flash("Бронювання змінено!", "success")
             return redirect(url_for("profile"))
@@ -863,34 +1156,23 @@ def edit_reservation(id):
         table_number = reserv.table.number if reserv.table else '?'
         table_id_cur = reserv.table_id
         reserv_id    = reserv.id
-        time_val     = reserv.time_start.strftime('%Y-%m-%dT%H:%M') if reserv.time_start else ''
 
-        all_tables   = cursor.query(Table).all()
-        reserved_ids = {
-            r.table_id for r in cursor.query(Reservation).all()
-            if r.id != id  # не рахуємо поточне бронювання як зайняте
-        }
+        # Схема показує зайнятість на вибраний проміжок, за замовчуванням - на поточний час броні
+        slot_start, slot_end = parse_slot(request.args.get('time'), request.args.get('duration')) \
+            or (reserv.time_start, reserv.time_end)
 
         # Передаємо JSON для JS карти столиків
-        tables_json = [
-            {
-                "id": t.id,
-                "number": t.number,
-                "type": t.type_table,
-                "label": t.label,
-                "x": t.x,
-                "y": t.y,
-                "taken": t.id in reserved_ids,
-                "current": t.id == table_id_cur,
-            }
-            for t in all_tables
-        ]
+        tables_json = hall_availability(cursor, slot_start, slot_end, exclude_reservation_id=id)
+        for t in tables_json:
+            t["current"] = t["id"] == table_id_cur
 
     return render_template("edit_reservation.html",
                            reserv_id=reserv_id,
                            table_id_cur=table_id_cur,
                            table_number=table_number,
-                           time_val=time_val,
+                           time_val=slot_start.strftime('%Y-%m-%dT%H:%M'),
+                           slot_duration=int((slot_end - slot_start).total_seconds() // 60),
+                           durations=RESERVATION_DURATIONS,
                            tables=tables_json,
                            csrf_token=session["csrf_token"],
                            nonce=g.nonce,
@@ -918,7 +1200,8 @@ def reservations_check():
                     user_nickname=res.user.nickname,
                     table_number=res.table.number,
                     table_label=res.table.label,
-                    time_start=res.time_start.strftime('%d.%m.%Y %H:%M')
+                    time_start=res.time_start.strftime('%d.%m.%Y %H:%M'),
+                    cursor=cursor
                 )
                 cursor.delete(res)
                 cursor.commit()
@@ -939,7 +1222,9 @@ def reservations_check():
             except:
                 pass
 
-        raw = query.order_by(Reservation.time_start.desc()).all()
+        columns = (Reservation.time_start, Reservation.id)
+        after, limit = page_args(columns)
+        raw, next_cursor = keyset_page(query, columns, after, limit)
 
         all_reservations = [
             {
@@ -953,9 +1238,14 @@ def reservations_check():
             for r in raw
         ]
 
+    if wants_json():
+        return jsonify(items=[dict(r, time_start=r["time_start"].isoformat()) for r in all_reservations],
+                       next_cursor=next_cursor)
+
     return render_template(
         'admin/reservations_check.html',
         all_reservations=all_reservations,
+        next_cursor=next_cursor,
         selected_date=selected_date,
         csrf_token=session['csrf_token'],
         nonce=g.nonce
@@ -969,7 +1259,7 @@ def menu_check():
         return redirect(url_for('home'))
 
     if request.method == "POST":
-        if request.form.get("csrf_token") != session["csrf_token"]:
+        if not csrf_valid():
             return "Запит заблоковано!", 403
 
         position_id = request.form['pos_id']
@@ -979,9 +1269,17 @@ def menu_check():
             if 'change_status' in request.form:
                 position_obj.active = not position_obj.active
             elif 'delete_position' in request.form:
-                cursor.query(Reviews).filter_by(menu_id=position_id).delete()
-                cursor.delete(position_obj)
+                if cursor.query(OrderItem.menu_id).filter_by(menu_id=position_id).first():
+                    # Страва є в історії замовлень - прибираємо з меню, але рядки замовлень лишаються
+                    position_obj.active = False
+                    flash('Страва вже є в замовленнях - її вимкнено замість видалення.')
+                else:
+                    # Агрегати рейтингу зникають разом зі стравою - в одній транзакції з відгуками
+                    cursor.query(Reviews).filter_by(menu_id=position_id).delete()
+                    cursor.delete(position_obj)
+            notify_menu_changed(cursor)
             cursor.commit()
+            menu_catalogue.invalidate()
 
     with Session() as cursor:
         all_positions = cursor.query(Menu).all()
@@ -997,11 +1295,19 @@ def all_users():
     if current_user.nickname != 'Admin':
         return redirect(url_for('home'))
 
+    columns = (Users.id,)
+    after, limit = page_args(columns)
     with Session() as cursor:
-        all_users = cursor.query(Users).with_entities(Users.id, Users.nickname, Users.email).all()
+        all_users, next_cursor = keyset_page(
+            cursor.query(Users).with_entities(Users.id, Users.nickname, Users.email),
+            columns, after, limit, descending=False)
+
+    if wants_json():
+        return jsonify(items=[u._asdict() for u in all_users], next_cursor=next_cursor)
 
     return render_template('admin/all_users.html',
                             all_users=all_users,
+                            next_cursor=next_cursor,
                             csrf_token=session['csrf_token'],
                             nonce=g.nonce)
 
@@ -1011,7 +1317,7 @@ def delete_user(user_id):
     if current_user.nickname != 'Admin':
         return redirect(url_for('home'))
 
-    if request.form.get("csrf_token") != session["csrf_token"]:
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
     with Session() as cursor:
@@ -1025,6 +1331,10 @@ def delete_user(user_id):
             flash('Не можна видалити адміністратора!', 'danger')
             return redirect(url_for('all_users'))
 
+        # Бот тримає кеш chat_id -> юзер, просимо його забути цього юзера
+        if user.telegram_chat_id:
+            notify_bot_identity(cursor, user.telegram_chat_id)
+
         # Чистимо всі записи
         cursor.query(Orders).filter_by(user_id=user_id).delete()
         cursor.query(Reservation).filter_by(user_id=user_id).delete()
@@ -1037,48 +1347,47 @@ def delete_user(user_id):
 
 
 # Кошик
-@app.route('/basket/update/<item_name>', methods=['POST'])
-def update_basket(item_name):
-    if request.form.get("csrf_token") != session["csrf_token"]:
+@app.route('/basket/update/<int:menu_id>', methods=['POST'])
+def update_basket(menu_id):
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
     if not current_user.is_authenticated:
         flash("Для оформлення замовлення необхідно бути зареєстрованим")
 
-    basket = session.get('basket', {})
+    basket = get_basket()
 
-    if item_name not in basket:
+    if menu_id not in basket:
         flash("Товар не знайдено у кошику", "danger")
         return redirect(url_for('create_order'))
 
-    qty = int(basket[item_name])
+    qty = basket[menu_id]
     action = request.form.get('action')
 
     if action == "plus":
-        if qty < 10:
-            basket[item_name] = qty + 1
+        if qty < MAX_QTY:
+            set_qty(menu_id, qty + 1)
         else:
-            flash("Максимальна кількість - 10", "warning")
+            flash(f"Максимальна кількість - {MAX_QTY}", "warning")
 
     elif action == "minus":
         if qty > 1:
-            basket[item_name] = qty - 1
+            set_qty(menu_id, qty - 1)
         else:
             flash("Мінімальна кількість - 1", "warning")
 
     elif action == "delete":
-        basket.pop(item_name)
+        remove_item(menu_id)
 
-    session['basket'] = basket
     return redirect(url_for('create_order'))
 
 
 @app.route('/basket/clear', methods=['POST'])
-def clear_basket():
-    if request.form.get("csrf_token") != session['csrf_token']:
+def basket_clear():
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
-    session.pop('basket', None)
+    clear_basket()
     flash("Кошик очищено")
 
     return redirect(url_for('create_order'))
@@ -1149,7 +1458,7 @@ def generate_code():
 @app.route('/profile/telegram_link', methods=['POST'])
 @login_required
 def telegram_link():
-    if request.form.get("csrf_token") != session["csrf_token"]:
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
     with Session() as cursor:
@@ -1169,11 +1478,13 @@ def telegram_link():
 @app.route('/profile/telegram_unlink', methods=['POST'])
 @login_required
 def telegram_unlink():
-    if request.form.get("csrf_token") != session["csrf_token"]:
+    if not csrf_valid():
         return "Запит заблоковано!", 403
 
     with Session() as cursor:
         user = cursor.query(Users).filter_by(id=current_user.id).first()
+        if user.telegram_chat_id:
+            notify_bot_identity(cursor, user.telegram_chat_id)
         user.telegram_chat_id = None
         cursor.commit()
 
@@ -0,0 +1,102 @@
+from flask import send_from_directory, current_app, Response, abort
+from werkzeug.security import safe_join
+from dotenv import load_dotenv
+from web.compression import precompress_static, precompressed_variant, COMPRESSED_SUFFIX
+import hashlib
+import mimetypes
+import os
+import re
+
+
+load_dotenv()
+# '' - файли віддає Flask; 'x-sendfile' - Apache/lighttpd; 'x-accel-redirect' - nginx
+STATIC_SENDFILE     = os.getenv('STATIC_SENDFILE', '').lower()
+STATIC_ACCEL_PREFIX = os.getenv('STATIC_ACCEL_PREFIX', '/_static/')   # internal location у nginx
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+FINGERPRINT_LEN   = 12
+# Фото страв вже названі хешем вмісту (shared/images.py) - їх не перераховуємо
+SKIP_DIRS         = {'menu'}
+HASHED_MEDIA_RE   = re.compile(r'^menu/[0-9a-f]{20}\.(webp|jpg)$')
+
+
+class AssetManifest:
+    """
+    Відбитки статики: css/haven.css -> css/haven.<sha256[:12]>.css.
+
+    Рахується один раз при старті. url_for('static', ...) видає ім'я з хешем,
+    тож такий файл можна кешувати назавжди - після зміни вмісту зміниться і URL.
+    """
+
+    def __init__(self, folder):
+        self.folder  = folder
+        self.hashed  = {}     # справжнє ім'я -> ім'я з хешем
+        self.sources = {}     # ім'я з хешем -> справжнє ім'я
+
+    def build(self):
+        self.hashed.clear()
+        self.sources.clear()
+        for root, dirs, files in os.walk(self.folder):
+            if root == self.folder:
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for file_name in files:
+                if file_name.endswith(tuple(COMPRESSED_SUFFIX.values())):
+                    continue                    # .gz/.br - копії, а не окремі ресурси
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()[:FINGERPRINT_LEN]
+                stem, ext = os.path.splitext(name)
+                self.hashed[name] = f"{stem}.{digest}{ext}"
+                self.sources[self.hashed[name]] = name
+        return self
+
+    def resolve(self, filename):
+        """(справжнє ім'я файлу, чи можна кешувати назавжди)"""
+        if filename in self.sources:
+            return self.sources[filename], True
+        return filename, bool(HASHED_MEDIA_RE.match(filename))
+
+
+def send_static(folder, filename, immutable):
+    if STATIC_SENDFILE == 'x-accel-redirect':
+        # Байти віддає nginx, воркер Python лише перевіряє шлях і ставить заголовки
+        path = safe_join(folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = STATIC_ACCEL_PREFIX + filename
+    else:
+        # Готова .br/.gz копія, якщо клієнт її приймає. При USE_X_SENDFILE
+        # Flask сам замінить тіло заголовком X-Sendfile
+        encoding, served = precompressed_variant(folder, filename)
+        response = send_from_directory(folder, served, mimetype=mimetypes.guess_type(filename)[0])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+
+    if immutable:
+        response.cache_control.no_cache  = None
+        response.cache_control.public    = True
+        response.cache_control.max_age   = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    precompress_static(app.static_folder, skip_dirs=SKIP_DIRS)
+    manifest = AssetManifest(app.static_folder).build()
+    app.config['USE_X_SENDFILE'] = STATIC_SENDFILE == 'x-sendfile'
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        # У debug файли правляться на ходу - відбиток зі старту був би застарілим
+        if endpoint == 'static' and not current_app.debug:
+            values['filename'] = manifest.hashed.get(values.get('filename'), values.get('filename'))
+
+    def static(filename):
+        real_name, immutable = manifest.resolve(filename)
+        return send_static(app.static_folder, real_name, immutable)
+
+    app.view_functions['static'] = static
+    return manifest
@@ -0,0 +1,156 @@
+from flask import session, g
+from flask_login import current_user
+from sqlalchemy import select, update, delete, func, case, cast, String
+from sqlalchemy.dialects.postgresql import insert
+from datetime import timedelta
+from dotenv import load_dotenv
+from time import sleep
+import secrets
+import os
+
+from shared.db import Session, Basket
+
+
+load_dotenv()
+USER_BASKET_TTL        = timedelta(days=int(os.getenv('BASKET_TTL_DAYS', 30)))
+ANON_BASKET_TTL        = timedelta(days=int(os.getenv('ANON_BASKET_TTL_DAYS', 7)))
+BASKET_CLEANUP_SECONDS = 3600
+BASKET_CLEANUP_BATCH   = 1000
+MAX_QTY                = 10
+
+
+# Кошик лежить у таблиці baskets, а не в cookie-сесії: у сесії лишається
+# тільки короткий токен гостя. Юзер бачить той самий кошик з будь-якого пристрою.
+
+def _owner(create=False):
+    """Ключ кошика для поточного запиту; None - у гостя ще немає кошика."""
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    if 'basket_token' not in session:
+        if not create:
+            return None
+        session['basket_token'] = secrets.token_urlsafe(16)
+    return f"anon:{session['basket_token']}"
+
+
+def _ttl(owner):
+    return USER_BASKET_TTL if owner.startswith('user:') else ANON_BASKET_TTL
+
+
+def _alive():
+    return Basket.expires_at > func.now()
+
+
+def _upsert(owner, items):
+    """INSERT ... ON CONFLICT: додає позиції до кошика (прострочений починається з нуля)."""
+    stmt = insert(Basket).values(owner=owner, items=items, expires_at=func.now() + _ttl(owner))
+    return stmt.on_conflict_do_update(
+        index_elements=[Basket.owner],
+        set_={
+            # excluded['items'] - бо excluded.items це метод колекції колонок
+            'items':      case((_alive(), Basket.items.op('||')(stmt.excluded['items'])),
+                               else_=stmt.excluded['items']),
+            'expires_at': stmt.excluded.expires_at,
+        },
+    )
+
+
+def get_basket():
+    """{menu_id: кількість}; в межах запиту читається один раз."""
+    if 'basket' not in g:
+        owner = _owner()
+        items = None
+        if owner:
+            with Session() as cursor:
+                items = cursor.scalar(select(Basket.items).where(Basket.owner == owner, _alive()))
+        g.basket = {int(menu_id): qty for menu_id, qty in (items or {}).items()}
+    return g.basket
+
+
+def basket_size():
+    return len(get_basket())
+
+
+def set_qty(menu_id, qty):
+    qty   = max(1, min(int(qty), MAX_QTY))
+    owner = _owner(create=True)
+    with Session() as cursor:
+        cursor.execute(_upsert(owner, {str(menu_id): qty}))
+        cursor.commit()
+    g.pop('basket', None)
+    return qty
+
+
+def remove_item(menu_id):
+    owner = _owner()
+    if not owner:
+        return
+    with Session() as cursor:
+        cursor.execute(
+            update(Basket)
+            .where(Basket.owner == owner)
+            .values(items=Basket.items.op('-')(cast(str(menu_id), String)))
+        )
+        cursor.commit()
+    g.pop('basket', None)
+
+
+def clear_basket(cursor=None):
+    """cursor - щоб очистити кошик в одній транзакції із замовленням."""
+    owner = _owner()
+    if owner:
+        if cursor is not None:
+            cursor.execute(delete(Basket).where(Basket.owner == owner))
+        else:
+            with Session() as cursor:
+                cursor.execute(delete(Basket).where(Basket.owner == owner))
+                cursor.commit()
+    g.pop('basket', None)
+
+
+def merge_basket_on_login(user_id):
+    """
+    Викликається одразу після login_user(): кошик гостя доливається в кошик юзера.
+    Для страви, що є в обох, перемагає кількість з гостьового - це найсвіжіший вибір.
+    """
+    token = session.pop('basket_token', None)
+    g.pop('basket', None)
+    if not token:
+        return
+
+    with Session() as cursor:
+        items = cursor.scalar(
+            delete(Basket)
+            .where(Basket.owner == f"anon:{token}", _alive())
+            .returning(Basket.items)
+        )
+        if items:
+            cursor.execute(_upsert(f"user:{user_id}", items))
+        cursor.commit()
+
+
+def cleanup_baskets(batch_size=BASKET_CLEANUP_BATCH):
+    """Видаляє прострочені кошики пачками; SKIP LOCKED - не чекаємо на активні рядки."""
+    removed = 0
+    while True:
+        expired = select(Basket.owner)\
+            .where(Basket.expires_at <= func.now())\
+            .limit(batch_size)\
+            .with_for_update(skip_locked=True)
+        with Session() as cursor:
+            result = cursor.execute(delete(Basket).where(Basket.owner.in_(expired)))
+            cursor.commit()
+        removed += result.rowcount
+        if result.rowcount < batch_size:
+            return removed
+
+
+def run_basket_cleanup(interval=BASKET_CLEANUP_SECONDS):
+    while True:
+        try:
+            removed = cleanup_baskets()
+            if removed:
+                print(f"[BASKETS] видалено прострочених кошиків: {removed}")
+        except Exception as e:
+            print(f"[BASKETS CLEANUP ERROR] {e}")
+        sleep(interval)
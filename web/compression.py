@@ -0,0 +1,171 @@
+from flask import request, session
+from time import thread_time
+from dotenv import load_dotenv
+import secrets
+import hmac
+import gzip
+import re
+import os
+
+try:
+    import brotli
+except ImportError:       # brotli необов'язковий - без нього лише gzip
+    brotli = None
+
+
+load_dotenv()
+COMPRESS_MIN_SIZE  = 1024       # менше - заголовки й CPU дорожчі за виграш
+COMPRESS_MIMETYPES = {'text/html', 'application/json', 'text/css', 'application/javascript',
+                      'image/svg+xml', 'text/plain'}
+GZIP_LEVEL         = 6          # на льоту - баланс швидкість/розмір
+BROTLI_QUALITY     = 5
+STATIC_EXTENSIONS  = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+COMPRESSED_SUFFIX  = {'br': '.br', 'gzip': '.gz'}
+# Секрети сесії, які сторінки вставляють у HTML. Поруч із відбитим вводом (value="{{ q }}")
+# довжина стиснутої відповіді видає їх по символу (BREACH).
+# CSRF-токен у кожній відповіді маскується новим випадковим XOR-ключем - стискати безпечно.
+MASKED_SECRETS     = ('csrf_token',)
+# Код прив'язки Telegram юзер читає очима - маскувати не можна, такі сторінки (профіль,
+# поки код не використано) не стискаємо
+SESSION_SECRETS    = ('telegram_code',)
+# 1 - друкувати по кожній відповіді: маршрут, байти до/після, CPU на стиснення
+COMPRESSION_STATS  = os.getenv('COMPRESSION_STATS', '0') == '1'
+
+
+def supported_encodings():
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def client_encoding():
+    """Найкраще кодування, яке приймає клієнт (з урахуванням q=0), або None."""
+    return request.accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding, static=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else BROTLI_QUALITY)
+    # mtime=0 - однаковий вміст дає однакові байти (і ETag)
+    return gzip.compress(data, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+
+
+def embeds_session_secret(data):
+    """Чи є в тілі відповіді секрет поточної сесії, який не маскується."""
+    return any(session.get(name) and session[name].encode() in data for name in SESSION_SECRETS)
+
+
+def mask_secret(secret):
+    """hex(ключ) + hex(ключ XOR секрет): щоразу інші байти, тож стиснення не видає секрет."""
+    raw = secret.encode()
+    pad = secrets.token_bytes(len(raw))
+    return (pad + bytes(a ^ b for a, b in zip(pad, raw))).hex()
+
+
+def unmask_secret(masked):
+    try:
+        raw = bytes.fromhex(masked)
+    except ValueError:
+        return ''
+    half = len(raw) // 2
+    return bytes(a ^ b for a, b in zip(raw[:half], raw[half:])).decode('latin-1')
+
+
+def mask_session_secrets(data):
+    """Замінює кожне входження MASKED_SECRETS у тілі на свіже масковане значення."""
+    for name in MASKED_SECRETS:
+        secret = session.get(name)
+        if secret and secret.encode() in data:
+            data = re.sub(re.escape(secret.encode()), lambda _: mask_secret(secret).encode(), data)
+    return data
+
+
+def secret_matches(name, submitted):
+    """Значення з форми - масковане чи ні - збігається з секретом сесії."""
+    secret = session.get(name)
+    if not secret or not submitted:
+        return False
+    return (hmac.compare_digest(submitted.encode(), secret.encode())
+            or hmac.compare_digest(unmask_secret(submitted).encode('latin-1'), secret.encode()))
+
+
+def csrf_valid():
+    return secret_matches('csrf_token', request.form.get('csrf_token', ''))
+
+
+def precompress_static(folder, skip_dirs=()):
+    """
+    Один раз при старті кладе поруч з текстовою статикою .gz і .br.
+    Запит потім віддає готовий файл - стиснення на кожен запит не відбувається.
+    Ті самі файли підхоплює nginx з gzip_static / brotli_static.
+    """
+    for root, dirs, files in os.walk(folder):
+        if root == folder:
+            dirs[:] = [d for d in dirs if d not in skip_dirs]
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            if os.path.splitext(file_name)[1] not in STATIC_EXTENSIONS:
+                continue
+            if os.path.getsize(path) < COMPRESS_MIN_SIZE:
+                continue
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            for encoding in supported_encodings():
+                target = path + COMPRESSED_SUFFIX[encoding]
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                with open(target + '.tmp', 'wb') as f:
+                    f.write(compress(data, encoding, static=True))
+                os.replace(target + '.tmp', target)
+
+
+def precompressed_variant(folder, filename):
+    """(кодування, ім'я стисненого файлу) для статики, якщо клієнт його приймає і файл є."""
+    encoding = client_encoding()
+    if encoding and os.path.isfile(os.path.join(folder, filename + COMPRESSED_SUFFIX[encoding])):
+        return encoding, filename + COMPRESSED_SUFFIX[encoding]
+    return None, filename
+
+
+def init_compression(app):
+
+    @app.after_request
+    def compress_response(response):
+        # Файли (send_file) ідуть потоком - статика вже стиснута заздалегідь
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESS_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = client_encoding()
+        data     = response.get_data()
+        # JSON-відповіді секретів сесії не містять - і не чіпаємо сесію (зайвий Vary: Cookie)
+        if response.mimetype == 'text/html':
+            # Маскуємо завжди, а не лише при стисненні - відповідь може стиснути й проксі
+            masked = mask_session_secrets(data)
+            if masked is not data:
+                data = masked
+                response.set_data(data)
+        if not encoding or len(data) < COMPRESS_MIN_SIZE:
+            return response
+        if response.mimetype == 'text/html' and embeds_session_secret(data):
+            if COMPRESSION_STATS:
+                print(f"[COMPRESS] {request.endpoint}: {len(data)} B без стиснення - у сторінці секрет сесії")
+            return response
+
+        started    = thread_time()
+        compressed = compress(data, encoding)
+        spent_ms   = (thread_time() - started) * 1000
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if response.get_etag()[0]:
+            # ETag стиснутої відповіді має відрізнятися від нестиснутої
+            response.set_etag(f"{response.get_etag()[0]}-{encoding}")
+
+        if COMPRESSION_STATS:
+            saved = len(data) - len(compressed)
+            print(f"[COMPRESS] {request.endpoint} {encoding}: {len(data)} -> {len(compressed)} B "
+                  f"(-{saved * 100 // len(data)}%), CPU {spent_ms:.2f} ms")
+        return response
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from time import monotonic
+import threading
+
+from shared.menu_cache import menu_catalogue
+
+
+class FragmentCache:
+    """
+    Кеш готових шматків сторінок (HTML картки страви, список відгуків, видача /api/menu).
+
+    Ключ фрагмента містить версії того, від чого він залежить ('menu', 'reviews').
+    Версію меню веде menu_catalogue (її піднімає invalidate()), відгуки викликають
+    bump() - старі ключі просто перестають збігатися і витісняються LRU. Все, що
+    залежить від запиту (nonce, csrf, кнопки автора), у фрагменти не потрапляє -
+    це підставляється після читання з кешу.
+    TTL - страховка для змін з іншого процесу (бот додає страви окремо від сайту).
+    """
+
+    def __init__(self, ttl=60, max_size=500):
+        self.ttl      = ttl
+        self.max_size = max_size
+        self.versions = {'reviews': 0}
+        self._items   = OrderedDict()
+        self._lock    = threading.Lock()
+
+    def bump(self, *names):
+        with self._lock:
+            for name in names:
+                self.versions[name] += 1
+
+    def version(self, name):
+        return menu_catalogue.version if name == 'menu' else self.versions[name]
+
+    def get_or_render(self, key, depends, render):
+        """render() викликається лише при промаху; None (нема що показати) не кешується."""
+        full_key = (key, tuple(self.version(name) for name in depends))
+        with self._lock:
+            cached = self._items.get(full_key)
+            if cached and cached[0] > monotonic():
+                self._items.move_to_end(full_key)
+                return cached[1]
+
+        value = render()
+        if value is None:
+            return None
+
+        with self._lock:
+            self._items[full_key] = (monotonic() + self.ttl, value)
+            self._items.move_to_end(full_key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return value
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,76 @@
+from flask import request, url_for, abort
+from sqlalchemy import tuple_
+from datetime import datetime
+
+
+PAGE_SIZE       = 20
+MAX_PAGE_SIZE   = 100
+TIME_FORMAT     = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(values):
+    """(час, id) -> '20250101120000000000.42' - ключ останнього рядка сторінки."""
+    return '.'.join(v.strftime(TIME_FORMAT) if isinstance(v, datetime) else str(v) for v in values)
+
+
+def decode_cursor(raw, columns):
+    """Розбирає курсор за типами колонок; ValueError - курсор підроблений або від іншого списку."""
+    parts = raw.split('.')
+    if len(parts) != len(columns):
+        raise ValueError(raw)
+    values = []
+    for part, column in zip(parts, columns):
+        if column.type.python_type is datetime:
+            values.append(datetime.strptime(part, TIME_FORMAT))
+        else:
+            values.append(column.type.python_type(part))
+    return tuple(values)
+
+
+def keyset_page(query, columns, after=None, limit=PAGE_SIZE, descending=True):
+    """
+    Одна сторінка списку без OFFSET і COUNT(*).
+    query   - Query з фільтрами, але без order_by
+    columns - ключ сортування, останньою завжди унікальна колонка: (Orders.order_time, Orders.id)
+    after   - розібраний курсор попередньої сторінки
+    Повертає (рядки, курсор наступної сторінки або None).
+    """
+    key = tuple_(*columns)
+    if after:
+        query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+    query = query.order_by(*(c.desc() if descending else c.asc() for c in columns))
+
+    # На один рядок більше - так видно, чи є наступна сторінка
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], c.key) for c in columns)
+    return rows, next_cursor
+
+
+def page_args(columns, default_limit=PAGE_SIZE):
+    """(after, limit) з ?cursor=...&limit=... поточного запиту; битий курсор - 400."""
+    limit = max(1, min(request.args.get('limit', default_limit, type=int), MAX_PAGE_SIZE))
+    raw   = request.args.get('cursor')
+    if not raw:
+        return None, limit
+    try:
+        return decode_cursor(raw, columns), limit
+    except ValueError:
+        abort(400)
+
+
+def wants_json():
+    """?format=json - та сама сторінка списку у JSON (для підвантаження скриптом)."""
+    return request.args.get('format') == 'json'
+
+
+def page_url(cursor=None):
+    """Посилання на сторінку з курсором (None - на першу) зі збереженням поточних фільтрів."""
+    args = request.args.to_dict()
+    args.pop('format', None)
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)